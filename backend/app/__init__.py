@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# .env читается один раз, до того как модули пакета возьмут настройки из os.environ
+load_dotenv()
@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from .database import SessionLocal, engine
+from .models import User, InviteCode
+from .panel_state import snapshot as panel_snapshot
+from .utils import require_admin
+
+router = APIRouter(prefix="/admin")
+
+EXPORT_BATCH = 1000
+
+USER_COLUMNS = ["id", "telegram_id", "username", "vpn_uuid", "created_at"]
+INVITE_COLUMNS = [
+    "id", "code", "is_used", "used_by_telegram_id", "used_by_username", "used_at", "created_at",
+]
+
+
+def _like_prefix(prefix: str) -> str:
+    # экранируем спецсимволы LIKE, чтобы "a_b" искал именно "a_b", а не "a?b"
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _row_dict(row, columns: list[str]) -> dict:
+    out = {}
+    for c in columns:
+        v = getattr(row, c)
+        out[c] = v.isoformat() if isinstance(v, datetime) else v
+    return out
+
+
+def _users_query(created_from, created_to, username_prefix):
+    q = select(*[getattr(User, c) for c in USER_COLUMNS])
+    if created_from is not None:
+        q = q.where(User.created_at >= created_from)
+    if created_to is not None:
+        q = q.where(User.created_at < created_to)
+    if username_prefix:
+        q = q.where(User.username.like(_like_prefix(username_prefix), escape="\\"))
+    return q
+
+
+def _invites_query(used, created_from, created_to, username_prefix):
+    q = select(*[getattr(InviteCode, c) for c in INVITE_COLUMNS])
+    if used is not None:
+        q = q.where(InviteCode.is_used == used)
+    if created_from is not None:
+        q = q.where(InviteCode.created_at >= created_from)
+    if created_to is not None:
+        q = q.where(InviteCode.created_at < created_to)
+    if username_prefix:
+        q = q.where(InviteCode.used_by_username.like(_like_prefix(username_prefix), escape="\\"))
+    return q
+
+
+def _page(query, id_col, columns: list[str], cursor: int | None, limit: int) -> dict:
+    """
+    Keyset-пагинация по id (свежие сверху): WHERE id < :cursor ORDER BY id DESC LIMIT n.
+    В отличие от OFFSET не сканирует уже пролистанные строки.
+    """
+    if cursor is not None:
+        query = query.where(id_col < cursor)
+    query = query.order_by(id_col.desc()).limit(limit + 1)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(query).all()
+    finally:
+        db.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [_row_dict(r, columns) for r in rows],
+        "next_cursor": rows[-1].id if has_more else None,
+    }
+
+
+def _stream(query, id_col, columns: list[str], fmt: str):
+    """
+    Генератор выгрузки: server-side cursor (stream_results) + yield_per,
+    в памяти держим не больше одной пачки строк.
+    """
+    query = query.order_by(id_col.desc())
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH).execute(query)
+
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            for part in result.partitions():
+                for row in part:
+                    writer.writerow([getattr(row, c) for c in columns])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+        else:
+            for part in result.partitions():
+                yield "".join(
+                    json.dumps(_row_dict(row, columns), ensure_ascii=False) + "\n" for row in part
+                )
+
+
+def _export_response(gen, name: str, fmt: str) -> StreamingResponse:
+    media = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        gen,
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@router.get("/users")
+def admin_list_users(
+    cursor: int | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    username_prefix: str | None = None,
+    x_admin_token: str | None = Header(default=None),
+):
+    require_admin(x_admin_token)
+    q = _users_query(created_from, created_to, username_prefix)
+    return _page(q, User.id, USER_COLUMNS, cursor, limit)
+
+
+@router.get("/invites")
+def admin_list_invites(
+    cursor: int | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    used: bool | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    username_prefix: str | None = None,
+    x_admin_token: str | None = Header(default=None),
+):
+    require_admin(x_admin_token)
+    q = _invites_query(used, created_from, created_to, username_prefix)
+    return _page(q, InviteCode.id, INVITE_COLUMNS, cursor, limit)
+
+
+@router.get("/users/export")
+def admin_export_users(
+    format: Literal["csv", "ndjson"] = "csv",
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    username_prefix: str | None = None,
+    x_admin_token: str | None = Header(default=None),
+):
+    require_admin(x_admin_token)
+    q = _users_query(created_from, created_to, username_prefix)
+    return _export_response(_stream(q, User.id, USER_COLUMNS, format), "users", format)
+
+
+@router.get("/invites/export")
+def admin_export_invites(
+    format: Literal["csv", "ndjson"] = "csv",
+    used: bool | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    username_prefix: str | None = None,
+    x_admin_token: str | None = Header(default=None),
+):
+    require_admin(x_admin_token)
+    q = _invites_query(used, created_from, created_to, username_prefix)
+    return _export_response(_stream(q, InviteCode.id, INVITE_COLUMNS, format), "invites", format)
+
+
+@router.get("/client/{telegram_id}/status")
+def admin_client_status(telegram_id: str, x_admin_token: str | None = Header(default=None)):
+    """
+    Есть ли клиент пользователя на панели и в каком он состоянии — по снимку
+    panel_state (обновляется health-check'ом), в саму панель не ходим.
+    """
+    require_admin(x_admin_token)
+    db = SessionLocal()
+    try:
+        vpn_uuid = db.scalar(select(User.vpn_uuid).where(User.telegram_id == telegram_id))
+    finally:
+        db.close()
+    if vpn_uuid is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    out = {"telegram_id": telegram_id, "vpn_uuid": vpn_uuid, "snapshot_age_seconds": panel_snapshot.age()}
+    if panel_snapshot.refreshed_at is None:
+        out["present"] = None
+        out["detail"] = "panel snapshot not loaded yet"
+        return out
+    client = panel_snapshot.lookup(vpn_uuid)
+    out["present"] = client is not None
+    if client is not None:
+        out.update(client)
+    return out
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from collections import deque
+
+# пол не даёт частым health-пробам (login/getInbound раз в 15 с) «натренировать»
+# таймаут до значения, при котором обычная пауза панели в пару секунд — уже отказ
+XUI_TIMEOUT_MIN = float(os.getenv("XUI_TIMEOUT_MIN", "5"))
+XUI_TIMEOUT_MAX = float(os.getenv("XUI_TIMEOUT_MAX", "10"))
+XUI_TIMEOUT_FACTOR = float(os.getenv("XUI_TIMEOUT_FACTOR", "3"))
+BREAKER_FAILURES = int(os.getenv("XUI_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("XUI_BREAKER_COOLDOWN", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Предохранитель на один эндпоинт панели.
+
+    closed    — запросы идут, считаем подряд идущие ошибки;
+    open      — после BREAKER_FAILURES ошибок подряд сразу отказываем, не ждём таймаут;
+    half_open — через BREAKER_COOLDOWN секунд пропускаем один пробный запрос:
+                успех закрывает цепь, ошибка снова открывает.
+
+    Таймаут адаптивный: p99 наблюдаемых латентностей * XUI_TIMEOUT_FACTOR,
+    в пределах [XUI_TIMEOUT_MIN, XUI_TIMEOUT_MAX]. Для неидемпотентных
+    вызовов (adaptive=False) — всегда XUI_TIMEOUT_MAX: оборванный по таймауту
+    addClient мог уже создать клиента на панели.
+    """
+
+    def __init__(self, name: str, window: int = 100, adaptive: bool = True):
+        self.name = name
+        self.adaptive = adaptive
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def timeout(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not self.adaptive or len(samples) < 10:
+            return XUI_TIMEOUT_MAX
+        p99 = samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+        return max(XUI_TIMEOUT_MIN, min(XUI_TIMEOUT_MAX, p99 * XUI_TIMEOUT_FACTOR))
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < BREAKER_COOLDOWN:
+                    raise CircuitOpen(f"x-ui {self.name}: circuit open")
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpen(f"x-ui {self.name}: circuit half-open, probe in flight")
+                self._trial_in_flight = True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= BREAKER_FAILURES:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "timeout": round(self.timeout(), 2)}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, adaptive: bool = True) -> CircuitBreaker:
+    b = _breakers.get(name)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.setdefault(name, CircuitBreaker(name, adaptive=adaptive))
+    return b
+
+
+def all_stats() -> dict:
+    return {name: b.stats() for name, b in list(_breakers.items())}
@@ -0,0 +1,174 @@
+from typing import Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from . import events
+from .database import AsyncSessionLocal
+from .models import BroadcastDelivery, BroadcastJob, RealityKey, User
+from .subscription import subscription_url
+from .utils import require_admin
+from .vless import build_vless_link, params_from_key
+
+# очередь рассылок: задания живут в broadcast_jobs, выполняет их бот
+router = APIRouter(prefix="/admin/broadcast")
+
+
+def _job_dict(job: BroadcastJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "text": job.text,
+        "reality_version": job.reality_version,
+        "status": job.status,
+        "cursor": job.cursor,
+        "sent": job.sent,
+        "failed": job.failed,
+    }
+
+
+class DeliveryResult(BaseModel):
+    user_id: int
+    status: Literal["sent", "failed", "blocked"]
+    error: str | None = None
+
+
+class Progress(BaseModel):
+    cursor: int
+    results: list[DeliveryResult] = []
+    done: bool = False
+
+
+@router.post("")
+async def broadcast_create(text: str, x_admin_token: str | None = Header(default=None)):
+    """Текстовая рассылка всем пользователям (команда /broadcast в боте)."""
+    require_admin(x_admin_token)
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Empty text")
+    async with AsyncSessionLocal() as db:
+        job = BroadcastJob(kind="text", text=text, status="pending", cursor=0, sent=0, failed=0)
+        db.add(job)
+        await db.commit()
+        events.emit("admin.broadcast", job_id=job.id, text=text[:200])
+        return {"job": _job_dict(job)}
+
+
+@router.get("/next")
+async def broadcast_next(x_admin_token: str | None = Header(default=None)):
+    require_admin(x_admin_token)
+    async with AsyncSessionLocal() as db:
+        job = await db.scalar(
+            select(BroadcastJob)
+            .where(BroadcastJob.status.in_(("pending", "running")))
+            .order_by(BroadcastJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if job is None:
+            return {"job": None}
+        if job.status == "pending":
+            job.status = "running"
+            job.started_at = func.now()
+        await db.commit()
+        return {"job": _job_dict(job)}
+
+
+@router.get("/{job_id}")
+async def broadcast_get(job_id: int, x_admin_token: str | None = Header(default=None)):
+    require_admin(x_admin_token)
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BroadcastJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job": _job_dict(job)}
+
+
+@router.get("/{job_id}/batch")
+async def broadcast_batch(
+    job_id: int,
+    limit: int = Query(default=100, ge=1, le=1000),
+    x_admin_token: str | None = Header(default=None),
+):
+    """
+    Следующая пачка получателей после job.cursor (keyset по users.id).
+    Те, кому уже доставлено (пачка оборвалась посередине), пропускаются.
+    """
+    require_admin(x_admin_token)
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BroadcastJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        rows = (await db.execute(
+            select(User.id, User.telegram_id, User.vpn_uuid, User.sub_token)
+            .where(User.id > job.cursor)
+            .where(~exists().where(
+                BroadcastDelivery.job_id == job_id,
+                BroadcastDelivery.user_id == User.id,
+            ))
+            .order_by(User.id)
+            .limit(limit)
+        )).all()
+
+        params = None
+        if job.kind == "reality_rotation":
+            # ссылки строим именно по версии задания, а не по тому, что сейчас в кеше воркера
+            key = await db.scalar(select(RealityKey).where(RealityKey.version == job.reality_version))
+            if key is None:
+                raise HTTPException(status_code=409, detail="Reality version of this job is gone")
+            params = params_from_key(key)
+
+    items = []
+    for r in rows:
+        item = {"user_id": r.id, "telegram_id": r.telegram_id}
+        if params is not None:
+            item["vless_link"] = build_vless_link(r.vpn_uuid, params=params)
+            item["subscription_url"] = subscription_url(r.sub_token)
+        items.append(item)
+
+    return {"job": _job_dict(job), "items": items}
+
+
+@router.post("/{job_id}/progress")
+async def broadcast_progress(
+    job_id: int,
+    body: Progress,
+    x_admin_token: str | None = Header(default=None),
+):
+    """
+    Результаты доставки одной порции + курсор. Повторная отправка тех же
+    результатов (ретрай после таймаута) не задваивает счётчики.
+    """
+    require_admin(x_admin_token)
+    async with AsyncSessionLocal() as db:
+        if await db.get(BroadcastJob, job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        sent = failed = 0
+        if body.results:
+            inserted = (await db.execute(
+                insert(BroadcastDelivery)
+                .values([
+                    {"job_id": job_id, "user_id": r.user_id, "status": r.status, "error": (r.error or "")[:300] or None}
+                    for r in body.results
+                ])
+                .on_conflict_do_nothing()
+                .returning(BroadcastDelivery.status)
+            )).scalars().all()
+            sent = sum(1 for st in inserted if st == "sent")
+            failed = len(inserted) - sent
+
+        values = {
+            "cursor": func.greatest(BroadcastJob.cursor, body.cursor),
+            "sent": BroadcastJob.sent + sent,
+            "failed": BroadcastJob.failed + failed,
+        }
+        if body.done:
+            values["status"] = "done"
+            values["finished_at"] = func.now()
+
+        await db.execute(update(BroadcastJob).where(BroadcastJob.id == job_id).values(**values))
+        await db.commit()
+    return {"ok": True}
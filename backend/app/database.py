@@ -1,12 +1,69 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
 
-load_dotenv()
+from .tracing import record as record_span
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+
+def _async_url(url: str) -> str:
+    # тот же DATABASE_URL, но через драйвер asyncpg
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL or "")
+
+# sync: админские выгрузки (server-side cursor), health-check, миграции
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
+
+# async: горячие пользовательские ручки (/invite/use, /me, /me/reset, /admin/create-invite)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
 Base = declarative_base()
+
+
+# ---- трейсинг: каждый SQL-запрос — спан db.query в текущем трейсе ----
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_trace_start", []).append((time.time(), time.perf_counter()))
+
+
+@event.listens_for(engine, "after_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("_trace_start")
+    if not stack:
+        return
+    start, t0 = stack.pop()
+    record_span("db.query", start, time.perf_counter() - t0, statement=statement[:200])
+
+
+@event.listens_for(engine, "handle_error")
+@event.listens_for(async_engine.sync_engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute при ошибке не вызывается — иначе запись осталась бы
+    # на соединении в пуле навсегда, а следующий спан взял бы чужое время старта
+    conn = context.connection
+    stack = conn.info.get("_trace_start") if conn is not None else None
+    if not stack:
+        return
+    start, t0 = stack.pop()
+    record_span(
+        "db.query", start, time.perf_counter() - t0, status="error",
+        statement=(context.statement or "")[:200], error=str(context.original_exception)[:200],
+    )
@@ -0,0 +1,176 @@
+"""
+Журнал событий (таблица events) с асинхронной пакетной записью.
+
+emit() только кладёт событие в очередь — запрос не ждёт БД.
+Фоновый поток раз в EVENTS_FLUSH_INTERVAL секунд (или по набору EVENTS_BATCH)
+пишет пачку одним multi-row INSERT, следит за месячными секциями
+и удаляет секции старше EVENTS_RETENTION_DAYS.
+
+    python -m app.events prune   # разово создать/удалить секции
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, text
+
+from .database import engine
+from .models import Event
+
+EVENTS_BATCH = int(os.getenv("EVENTS_BATCH", "500"))
+EVENTS_FLUSH_INTERVAL = float(os.getenv("EVENTS_FLUSH_INTERVAL", "1"))
+EVENTS_QUEUE_MAX = int(os.getenv("EVENTS_QUEUE_MAX", "10000"))
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "180"))
+EVENTS_MAINTENANCE_INTERVAL = float(os.getenv("EVENTS_MAINTENANCE_INTERVAL", "3600"))
+
+
+def _month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def ensure_partitions(conn, months_ahead: int = 1):
+    start = _month_start(datetime.now(timezone.utc))
+    for _ in range(months_ahead + 1):
+        end = _next_month(start)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS events_{start:%Y_%m} PARTITION OF events "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        start = end
+
+
+def prune_partitions(conn, retention_days: int = EVENTS_RETENTION_DAYS) -> list[str]:
+    """Удалить месячные секции, целиком лежащие старше retention_days."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    rows = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'events'
+    """)).scalars().all()
+
+    dropped = []
+    for name in rows:
+        try:
+            year, month = int(name[7:11]), int(name[12:14])
+        except ValueError:
+            continue
+        if _next_month(datetime(year, month, 1, tzinfo=timezone.utc)) <= cutoff:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            dropped.append(name)
+    return dropped
+
+
+class EventWriter:
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=EVENTS_QUEUE_MAX)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_maintenance = 0.0
+        self.dropped = 0
+
+    def emit(self, kind: str, telegram_id: str | None = None, vpn_uuid: str | None = None, **data):
+        row = {
+            "kind": kind,
+            "telegram_id": telegram_id,
+            "vpn_uuid": vpn_uuid,
+            "data": data or None,
+            "created_at": datetime.now(timezone.utc),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # БД лежит и очередь забилась — теряем аудит, но не тормозим запросы
+            self.dropped += 1
+
+    def _drain(self, first) -> list[dict]:
+        batch = [first]
+        while len(batch) < EVENTS_BATCH:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list[dict]):
+        with engine.begin() as conn:
+            # executemany -> один INSERT ... VALUES (...), (...), ... (insertmanyvalues)
+            conn.execute(insert(Event), batch)
+
+    def _maintenance(self):
+        with engine.begin() as conn:
+            ensure_partitions(conn)
+            prune_partitions(conn)
+        self._last_maintenance = time.monotonic()
+
+    def flush(self):
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._write(self._drain(first))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_maintenance > EVENTS_MAINTENANCE_INTERVAL:
+                    self._maintenance()
+            except Exception as e:
+                print(f"events: maintenance failed: {e}", file=sys.stderr)
+                self._last_maintenance = time.monotonic()
+
+            try:
+                first = self._queue.get(timeout=EVENTS_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            # даём накопиться пачке, если события идут потоком
+            time.sleep(min(0.05, EVENTS_FLUSH_INTERVAL))
+            batch = self._drain(first)
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"events: dropped {len(batch)} events: {e}", file=sys.stderr)
+                self.dropped += len(batch)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="event-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"events: final flush failed: {e}", file=sys.stderr)
+
+
+writer = EventWriter()
+emit = writer.emit
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "prune":
+        print("usage: python -m app.events prune", file=sys.stderr)
+        sys.exit(2)
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+        dropped = prune_partitions(conn)
+    print("dropped: " + (", ".join(dropped) if dropped else "nothing"))
+
+
+if __name__ == "__main__":
+    main()
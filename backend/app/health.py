@@ -0,0 +1,133 @@
+import asyncio
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import text
+
+from .database import async_engine, engine
+from . import xui_client
+from .panel_state import snapshot as panel_snapshot
+from .breaker import all_stats as breaker_stats
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "5"))
+
+
+def _probe(fn) -> dict:
+    started = time.perf_counter()
+    try:
+        fn()
+        ok, detail = True, None
+    except Exception as e:
+        ok, detail = False, str(e)[:300]
+    return {
+        "ok": ok,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "detail": detail,
+    }
+
+
+def _check_db():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+async def _select_one_async():
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+def _check_async_db(loop: asyncio.AbstractEventLoop):
+    # соединения asyncpg привязаны к loop'у приложения — проверяем пул там же,
+    # где его используют горячие ручки; исчерпанный пул даст таймаут
+    fut = asyncio.run_coroutine_threadsafe(_select_one_async(), loop)
+    try:
+        fut.result(timeout=HEALTH_DB_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        fut.cancel()
+        raise TimeoutError(f"async pool: no answer in {HEALTH_DB_TIMEOUT}s")
+
+
+def _check_inbound():
+    inbound = xui_client.get_inbound()
+    # тот же ответ обновляет снимок клиентов панели (panel_state)
+    try:
+        panel_snapshot.update(inbound)
+    except Exception as e:
+        print(f"panel snapshot: update failed: {e}", file=sys.stderr)
+
+
+class HealthChecker:
+    """
+    Фоновая проверка БД и x-ui по расписанию.
+    Эндпоинты отдают закешированный результат — нажатия «Статус сервиса»
+    и пробы blackbox не делают ни одного запроса в БД/панель.
+    """
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL):
+        self.interval = interval
+        self._result: dict | None = None
+        self._checked_at: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def check_once(self) -> dict:
+        # database — async-пул (asyncpg) горячих ручек, database_sync — psycopg2 для выгрузок
+        components = {}
+        if self._loop is not None:
+            components["database"] = _probe(lambda: _check_async_db(self._loop))
+        components["database_sync"] = _probe(_check_db)
+
+        # inbound проверяем только если логин прошёл — иначе это заведомо 401
+        components["xui_login"] = _probe(xui_client.login)
+        if components["xui_login"]["ok"]:
+            components["xui_inbound"] = _probe(_check_inbound)
+        else:
+            components["xui_inbound"] = {"ok": False, "latency_ms": 0.0, "detail": "skipped: login failed"}
+
+        self._result = components
+        self._checked_at = time.time()
+        return components
+
+    def snapshot(self) -> dict:
+        components = self._result
+        checked_at = self._checked_at
+        if components is None or checked_at is None:
+            return {"status": "starting", "age_seconds": None, "checked_at": None, "components": {}}
+
+        ok = all(c["ok"] for c in components.values())
+        return {
+            "status": "ok" if ok else "degraded",
+            "age_seconds": round(time.time() - checked_at, 1),
+            "checked_at": checked_at,
+            "components": components,
+            "xui_breakers": breaker_stats(),
+            "panel_snapshot": panel_snapshot.stats(),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check_once()
+            except Exception:
+                # проверка не должна убивать поток
+                pass
+            self._stop.wait(self.interval)
+
+    def start(self, loop: asyncio.AbstractEventLoop | None = None):
+        self._loop = loop
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-checker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+checker = HealthChecker()
@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .tracing import span
+
+
+class Inflight:
+    """
+    Операции с панелью, которые сейчас выполняются в этом процессе.
+
+    Повторный вызов с тем же ключом (бот ретраит /invite/use по таймауту,
+    пока первый вызов ещё ждёт x-ui) не запускает операцию второй раз,
+    а ждёт результат первой — или её исключение. Между воркерами
+    дубли отсекает lock() + повторная проверка состояния в БД.
+    """
+
+    def __init__(self):
+        self._running: dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def _done(self, key: str, fut: asyncio.Future):
+        if self._running.get(key) is fut:
+            del self._running[key]
+        if not fut.cancelled():
+            # все ждавшие могли уйти — не даём asyncio ругаться на «непрочитанное» исключение
+            fut.exception()
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._running.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._running[key] = fut
+            fut.add_done_callback(lambda f: self._done(key, f))
+            # shield: клиент оборвал запрос — операция с панелью всё равно доводится до конца
+            return await asyncio.shield(fut)
+
+        self.coalesced += 1
+        with span("inflight.join", key=key):
+            return await asyncio.shield(fut)
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+
+async def lock(db: AsyncSession, key: str):
+    """Advisory lock по ключу на время транзакции db (снимается на commit/rollback)."""
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(key))))
+
+
+registry = Inflight()
@@ -1,72 +1,73 @@
-from fastapi import FastAPI, HTTPException, Header
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, text
+import asyncio
 import os
-import urllib.parse
 import secrets
 import string
+from contextlib import asynccontextmanager
 
-from .database import engine, Base, SessionLocal
+from .database import AsyncSessionLocal, async_engine
 from .models import User, InviteCode
-from .utils import generate_vpn_uuid
+from .utils import generate_vpn_uuid, require_admin
+from .vless import build_vless_link
 from .xui_client import create_vpn, remove_vpn
-
-load_dotenv()
-
-app = FastAPI(title="AronxVPN API")
-Base.metadata.create_all(bind=engine)
-
-
-def get_db() -> Session:
-    return SessionLocal()
-
-
-def _get_env(name: str) -> str:
-    v = os.getenv(name)
-    if v is None or str(v).strip() == "":
-        raise HTTPException(status_code=500, detail=f"Missing env var: {name}")
-    return str(v).strip()
-
-
-def _pick_reality_sid(raw: str) -> str:
-    parts = [p.strip() for p in raw.split(",") if p.strip()]
-    return parts[0] if parts else raw.strip()
-
-
-def build_vless_link(uuid: str) -> str:
-    server_ip = _get_env("VPN_SERVER_IP")
-    port = _get_env("VPN_SERVER_PORT")
-
-    pbk = _get_env("REALITY_PBK")
-    sid_raw = _get_env("REALITY_SID")
-    sni = _get_env("REALITY_SNI")
-    fp = os.getenv("REALITY_FP", "chrome").strip() or "chrome"
-
-    # spiderX (в панели у тебя "/")
-    spx = os.getenv("REALITY_SPX", "/").strip() or "/"
-
-    sid = _pick_reality_sid(sid_raw)
-
-    pbk_q = urllib.parse.quote(pbk, safe="")
-    sid_q = urllib.parse.quote(sid, safe="")
-    sni_q = urllib.parse.quote(sni, safe="")
-    fp_q = urllib.parse.quote(fp, safe="")
-    spx_q = urllib.parse.quote(spx, safe="")
-
-    return (
-        f"vless://{uuid}@{server_ip}:{port}/"
-        f"?type=tcp"
-        f"&encryption=none"
-        f"&security=reality"
-        f"&pbk={pbk_q}"
-        f"&fp={fp_q}"
-        f"&sni={sni_q}"
-        f"&sid={sid_q}"
-        f"&spx={spx_q}"
-        f"&flow=xtls-rprx-vision"
-        f"#AronxVPN"
-    )
+from .health import checker as health_checker
+from .panel_state import snapshot as panel_snapshot
+from .reality import store as reality_store
+from . import tracing
+from . import events
+from . import inflight
+from .admin import router as admin_router
+from .subscription import router as sub_router, cache as sub_cache, subscription_url, warm_in_background as warm_subscriptions
+from .broadcast import router as broadcast_router
+
+REALITY_STARTUP_WAIT = float(os.getenv("REALITY_STARTUP_WAIT", "2"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # импорт модулей в БД не ходит: вся работа с БД/панелью — здесь и в фоновых потоках
+    health_checker.start(asyncio.get_running_loop())
+    reality_store.start()
+    events.writer.start()
+    # первые ссылки должны строиться по активной версии Reality, но если БД
+    # не отвечает, процесс не ждёт её дольше REALITY_STARTUP_WAIT
+    await run_in_threadpool(reality_store.wait_ready, REALITY_STARTUP_WAIT)
+    # после Reality: тела подписок рендерятся уже с активной версией ключей
+    warm_subscriptions()
+    yield
+    health_checker.stop()
+    reality_store.stop()
+    await run_in_threadpool(events.writer.stop)
+    await async_engine.dispose()
+
+
+# схема БД ведётся миграциями Alembic (alembic upgrade head), не при старте приложения
+app = FastAPI(title="AronxVPN API", lifespan=lifespan)
+app.include_router(admin_router)
+app.include_router(sub_router)
+app.include_router(broadcast_router)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # trace id приходит от бота (api_json), иначе создаём свой;
+    # заголовки от чужих клиентов игнорируем — семплирование решаем сами
+    if tracing.is_trusted(request.headers.get(tracing.TOKEN_HEADER)):
+        tracing.start_trace(
+            request.headers.get(tracing.TRACE_HEADER),
+            tracing.parse_sampled(request.headers.get(tracing.SAMPLED_HEADER)),
+            request.headers.get(tracing.PARENT_HEADER),
+        )
+    else:
+        tracing.start_trace(None, None)
+    with tracing.span(f"http {request.method} {request.url.path}") as attrs:
+        response = await call_next(request)
+        attrs["status_code"] = response.status_code
+    response.headers[tracing.TRACE_HEADER] = tracing.current_trace_id()
+    return response
 
 
 def gen_invite_code(length: int = 10) -> str:
@@ -79,64 +80,84 @@ def root():
     return {"status": "ok"}
 
 
+@app.get("/health")
+def health():
+    # отдаём результат фоновой проверки, сами в БД/панель не ходим
+    snap = health_checker.snapshot()
+    return JSONResponse(snap, status_code=200 if snap["status"] == "ok" else 503)
+
+
 @app.get("/health/db")
 def db_health():
-    try:
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        return {"database": "connected"}
-    except Exception as e:
-        return {"database": "error", "detail": str(e)}
+    snap = health_checker.snapshot()
+    db = snap["components"].get("database")
+    if db is None:
+        return {"database": "unknown", "detail": "health check not finished yet"}
+    if db["ok"]:
+        return {"database": "connected", "age_seconds": snap["age_seconds"]}
+    return {"database": "error", "detail": db["detail"], "age_seconds": snap["age_seconds"]}
 
 
 # ---- ADMIN ----
 
 @app.post("/admin/create-invite")
-def admin_create_invite(x_admin_token: str | None = Header(default=None)):
-    admin_token = _get_env("ADMIN_TOKEN")
-    if not x_admin_token or x_admin_token != admin_token:
-        raise HTTPException(status_code=401, detail="Unauthorized")
+async def admin_create_invite(x_admin_token: str | None = Header(default=None)):
+    require_admin(x_admin_token)
 
-    db = get_db()
-    try:
+    async with AsyncSessionLocal() as db:
         for _ in range(5):
             code = gen_invite_code()
-            exists = db.query(InviteCode).filter(InviteCode.code == code).first()
+            exists = await db.scalar(select(InviteCode.id).where(InviteCode.code == code))
             if not exists:
                 invite = InviteCode(code=code, is_used=False)
                 db.add(invite)
-                db.commit()
-                db.refresh(invite)
+                await db.commit()
+                events.emit("admin.create_invite", code=invite.code)
                 return {"invite_code": invite.code, "is_used": invite.is_used}
 
         raise HTTPException(status_code=500, detail="Failed to generate unique invite code")
-    finally:
-        db.close()
 
 
 # ---- USER FLOW ----
 
 @app.post("/invite/use")
-def use_invite(invite_code: str, telegram_id: str, username: str | None = None):
-    db = get_db()
-    try:
+async def use_invite(invite_code: str, telegram_id: str, username: str | None = None):
+    # ретрай бота, пока первый вызов ещё ждёт панель, получает тот же результат
+    return await inflight.registry.run(
+        f"redeem:{telegram_id}:{invite_code}",
+        lambda: _use_invite(invite_code, telegram_id, username),
+    )
+
+
+async def _use_invite(invite_code: str, telegram_id: str, username: str | None):
+    async with AsyncSessionLocal() as db:
+        # другой воркер мог уже начать регистрацию этого telegram_id — ждём его и смотрим, что в БД
+        await inflight.lock(db, f"user:{telegram_id}")
+
         # если уже есть пользователь — просто отдадим его ссылку (повторная регистрация не нужна)
-        existing = db.query(User).filter(User.telegram_id == telegram_id).first()
+        existing = await db.scalar(select(User).where(User.telegram_id == telegram_id))
         if existing:
-            return {"vless_link": build_vless_link(existing.vpn_uuid), "existing": True}
-
-        inv = db.query(InviteCode).filter(InviteCode.code == invite_code).first()
+            return {
+                "vless_link": build_vless_link(existing.vpn_uuid),
+                "subscription_url": subscription_url(existing.sub_token),
+                "existing": True,
+            }
+
+        # FOR UPDATE: один код не погасят параллельно два разных пользователя
+        inv = await db.scalar(select(InviteCode).where(InviteCode.code == invite_code).with_for_update())
         if not inv:
             raise HTTPException(status_code=404, detail="Invite code not found")
         if inv.is_used:
             raise HTTPException(status_code=409, detail="Invite code already used")
 
-        # создаём VPN клиента в x-ui
+        # создаём VPN клиента в x-ui (requests — синхронный, уводим в threadpool)
         uuid = generate_vpn_uuid()
         try:
-            create_vpn(uuid)
+            await run_in_threadpool(create_vpn, uuid)
         except Exception as e:
+            events.emit("provision_failed", telegram_id, uuid, op="redeem", invite_code=invite_code, error=str(e)[:300])
             raise HTTPException(status_code=502, detail=f"x-ui error: {e}")
+        panel_snapshot.add(uuid)
 
         user = User(
             telegram_id=telegram_id,
@@ -150,57 +171,83 @@ def use_invite(invite_code: str, telegram_id: str, username: str | None = None):
         inv.used_by_username = username
         inv.used_at = text("CURRENT_TIMESTAMP")
 
-        db.commit()
+        await db.commit()
+        sub_cache.put(user.sub_token, uuid)
+        events.emit("redeem", telegram_id, uuid, invite_code=invite_code, username=username)
 
-        return {"vless_link": build_vless_link(uuid), "existing": False}
-    finally:
-        db.close()
+        return {
+            "vless_link": build_vless_link(uuid),
+            "subscription_url": subscription_url(user.sub_token),
+            "existing": False,
+        }
 
 
 @app.get("/me")
-def me(telegram_id: str):
-    db = get_db()
-    try:
-        user = db.query(User).filter(User.telegram_id == telegram_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found. Ask admin for invite code and use /start in bot.")
-        return {"vless_link": build_vless_link(user.vpn_uuid)}
-    finally:
-        db.close()
+async def me(telegram_id: str):
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(User.vpn_uuid, User.sub_token).where(User.telegram_id == telegram_id)
+        )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found. Ask admin for invite code and use /start in bot.")
+    return {
+        "vless_link": build_vless_link(row.vpn_uuid),
+        "subscription_url": subscription_url(row.sub_token),
+    }
+
+
+def _reset_result(user: User, old_uuid: str) -> dict:
+    return {
+        "vless_link": build_vless_link(user.vpn_uuid),
+        "subscription_url": subscription_url(user.sub_token),
+        "old_uuid": old_uuid,
+        "new_uuid": user.vpn_uuid,
+    }
 
 
 # ✅ ДОБАВИЛ: сброс/перевыпуск VPN (новый UUID) для текущего telegram_id
 @app.post("/me/reset")
-def me_reset(telegram_id: str):
-    db = get_db()
-    try:
-        user = db.query(User).filter(User.telegram_id == telegram_id).first()
-        if not user:
+async def me_reset(telegram_id: str):
+    # двойное нажатие / ретрай бота — один перевыпуск, один новый UUID на всех
+    return await inflight.registry.run(f"reset:{telegram_id}", lambda: _me_reset(telegram_id))
+
+
+async def _me_reset(telegram_id: str):
+    async with AsyncSessionLocal() as db:
+        seen_uuid = await db.scalar(select(User.vpn_uuid).where(User.telegram_id == telegram_id))
+        if seen_uuid is None:
             raise HTTPException(status_code=404, detail="User not found")
 
+        await inflight.lock(db, f"user:{telegram_id}")
+        user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
+        if user.vpn_uuid != seen_uuid:
+            # пока ждали lock, другой воркер уже перевыпустил ключ — второй сброс не нужен
+            return _reset_result(user, seen_uuid)
+
         old_uuid = user.vpn_uuid
         new_uuid = generate_vpn_uuid()
 
         # 1) пробуем удалить старого клиента (если remove_vpn глючит — не валим сброс)
         try:
-            remove_vpn(old_uuid)
+            await inflight.registry.run(f"remove:{old_uuid}", lambda: run_in_threadpool(remove_vpn, old_uuid))
+            panel_snapshot.discard(old_uuid)
         except Exception:
             pass
 
         # 2) создаём нового клиента
         try:
-            create_vpn(new_uuid)
+            await run_in_threadpool(create_vpn, new_uuid)
         except Exception as e:
+            events.emit("provision_failed", telegram_id, new_uuid, op="reset", old_uuid=old_uuid, error=str(e)[:300])
             raise HTTPException(status_code=502, detail=f"x-ui error: {e}")
+        panel_snapshot.add(new_uuid)
 
         # 3) обновляем UUID в БД
         user.vpn_uuid = new_uuid
-        db.commit()
+        await db.commit()
+        # подписка по тому же токену сразу отдаёт новый UUID
+        sub_cache.put(user.sub_token, new_uuid)
+        # старый UUID сохраняется только здесь
+        events.emit("reset", telegram_id, new_uuid, old_uuid=old_uuid)
 
-        return {
-            "vless_link": build_vless_link(new_uuid),
-            "old_uuid": old_uuid,
-            "new_uuid": new_uuid,
-        }
-    finally:
-        db.close()
+        return _reset_result(user, old_uuid)
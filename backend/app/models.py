@@ -1,14 +1,26 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, UniqueConstraint
+import secrets
+
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Sequence,
+    func, UniqueConstraint, Index, text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from .database import Base
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+        Index("ix_users_username_prefix", "username", postgresql_ops={"username": "varchar_pattern_ops"}),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(String, unique=True, index=True, nullable=False)
     username = Column(String, nullable=True)
     vpn_uuid = Column(String, unique=True, index=True, nullable=False)
+    # неугадываемый токен для /sub/{token}, не меняется при сбросе VPN
+    sub_token = Column(String, unique=True, index=True, nullable=False, default=lambda: secrets.token_urlsafe(24))
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -17,6 +29,15 @@ class InviteCode(Base):
     __tablename__ = "invite_codes"
     __table_args__ = (
         UniqueConstraint("code", name="uq_invite_code"),
+        # админские выборки: неиспользованные/использованные, свежие сверху
+        Index("ix_invite_codes_is_used_created_at", "is_used", "created_at"),
+        Index("ix_invite_codes_unused_created_at", "created_at", postgresql_where=text("is_used = false")),
+        Index("ix_invite_codes_unused_id", "id", postgresql_where=text("is_used = false")),
+        Index(
+            "ix_invite_codes_used_by_username_prefix",
+            "used_by_username",
+            postgresql_ops={"used_by_username": "varchar_pattern_ops"},
+        ),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -29,3 +50,78 @@ class InviteCode(Base):
     used_at = Column(DateTime(timezone=True), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RealityKey(Base):
+    """Версия Reality-параметров; активна ровно одна (см. app.rotate_reality)."""
+    __tablename__ = "reality_keys"
+    __table_args__ = (
+        Index("uq_reality_keys_active", "is_active", unique=True, postgresql_where=text("is_active")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, unique=True)
+    pbk = Column(String, nullable=False)
+    sid = Column(String, nullable=False)
+    sni = Column(String, nullable=False)
+    fp = Column(String, nullable=False, default="chrome")
+    spx = Column(String, nullable=False, default="/")
+    is_active = Column(Boolean, nullable=False, default=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BroadcastJob(Base):
+    """
+    Рассылка всем пользователям, которую выполняет бот.
+    cursor — последний обработанный users.id, по нему рассылка продолжается после падения.
+    """
+    __tablename__ = "broadcast_jobs"
+    __table_args__ = (
+        Index("ix_broadcast_jobs_open", "id", postgresql_where=text("status IN ('pending', 'running')")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # reality_rotation | text
+    text = Column(String, nullable=True)
+    reality_version = Column(Integer, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending | running | done | cancelled
+    cursor = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class BroadcastDelivery(Base):
+    """Кому рассылка уже ушла — при повторе пачки после падения эти пользователи пропускаются."""
+    __tablename__ = "broadcast_deliveries"
+
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False)  # sent | failed | blocked
+    error = Column(String, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Event(Base):
+    """
+    Append-only журнал: redeem / reset / provision_failed / admin.*.
+    Таблица секционирована по месяцам (created_at), старые секции удаляются целиком.
+    Пишется только через app.events (пачками из фонового потока).
+    """
+    __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_telegram_id_created_at", "telegram_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(BigInteger, Sequence("events_id_seq"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    kind = Column(String, nullable=False)
+    telegram_id = Column(String, nullable=True)
+    vpn_uuid = Column(String, nullable=True)
+    data = Column(JSONB(none_as_null=True), nullable=True)
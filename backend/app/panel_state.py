@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import uuid as uuid_lib
+
+# флаги клиента в снимке — одно маленькое int на клиента
+ENABLED = 1      # включён в настройках инбаунда и в clientStats
+HAS_TRAFFIC = 2  # up + down > 0: клиент хоть раз подключался
+EXPIRED = 4      # expiryTime в прошлом
+DEPLETED = 8     # исчерпан лимит трафика total
+
+FLAG_NAMES = {ENABLED: "enabled", HAS_TRAFFIC: "has_traffic", EXPIRED: "expired", DEPLETED: "depleted"}
+
+
+def _key(client_id: str):
+    # 16 байт вместо 36-символьной строки; id не-UUID (клиенты, заведённые руками) — как есть
+    try:
+        return uuid_lib.UUID(client_id).bytes
+    except (ValueError, AttributeError, TypeError):
+        return client_id
+
+
+def parse_inbound(inbound: dict) -> dict:
+    """obj из GET /panel/api/inbounds/get/{id} -> {key(uuid): флаги}."""
+    settings = inbound.get("settings") or {}
+    if isinstance(settings, str):
+        settings = json.loads(settings or "{}")
+    # трафик в clientStats лежит по email; у наших клиентов email == uuid
+    stats = {s.get("email"): s for s in inbound.get("clientStats") or []}
+    now_ms = time.time() * 1000
+
+    clients = {}
+    for c in settings.get("clients") or []:
+        if not c.get("id"):
+            continue
+        st = stats.get(c.get("email")) or {}
+        used = (st.get("up") or 0) + (st.get("down") or 0)
+        expiry = c.get("expiryTime") or st.get("expiryTime") or 0
+        total = st.get("total") or c.get("totalGB") or 0
+
+        flags = 0
+        if c.get("enable", True) and st.get("enable", True):
+            flags |= ENABLED
+        if used > 0:
+            flags |= HAS_TRAFFIC
+        if 0 < expiry < now_ms:
+            flags |= EXPIRED
+        if total > 0 and used >= total:
+            flags |= DEPLETED
+        clients[_key(c["id"])] = flags
+    return clients
+
+
+class PanelSnapshot:
+    """
+    Снимок клиентов инбаунда в памяти: uuid -> флаги (ENABLED | HAS_TRAFFIC | ...).
+    Обновляется тем же getInbound, которым health-check и так проверяет панель
+    (раз в HEALTH_CHECK_INTERVAL), — ответы поддержке панель не дёргают.
+    Новый список накладывается на старый диффом: в обычном случае, когда
+    ничего не поменялось, словарь не пересобирается.
+    """
+
+    def __init__(self):
+        self._clients: dict = {}
+        self._lock = threading.Lock()
+        self.refreshed_at: float | None = None
+        self.last_diff = {"added": 0, "removed": 0, "changed": 0}
+
+    def update(self, inbound: dict) -> dict:
+        fresh = parse_inbound(inbound)
+        with self._lock:
+            current = self._clients
+            removed = current.keys() - fresh.keys()
+            added = changed = 0
+            for key in removed:
+                del current[key]
+            for key, flags in fresh.items():
+                old = current.get(key)
+                if old == flags:
+                    continue
+                if old is None:
+                    added += 1
+                else:
+                    changed += 1
+                current[key] = flags
+            self.refreshed_at = time.time()
+            self.last_diff = {"added": added, "removed": len(removed), "changed": changed}
+        return self.last_diff
+
+    # свои add/delete видны сразу, не дожидаясь следующего getInbound
+    def add(self, client_id: str):
+        with self._lock:
+            self._clients[_key(client_id)] = ENABLED
+
+    def discard(self, client_id: str):
+        with self._lock:
+            self._clients.pop(_key(client_id), None)
+
+    def age(self) -> float | None:
+        if self.refreshed_at is None:
+            return None
+        return round(time.time() - self.refreshed_at, 1)
+
+    def lookup(self, client_id: str) -> dict | None:
+        """Флаги клиента словами или None, если на панели его нет."""
+        flags = self._clients.get(_key(client_id))
+        if flags is None:
+            return None
+        return {name: bool(flags & bit) for bit, name in FLAG_NAMES.items()}
+
+    def stats(self) -> dict:
+        return {"clients": len(self._clients), "age_seconds": self.age(), "last_diff": self.last_diff}
+
+
+snapshot = PanelSnapshot()
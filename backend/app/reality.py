@@ -0,0 +1,77 @@
+import os
+import threading
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .models import RealityKey
+
+REALITY_REFRESH_INTERVAL = float(os.getenv("REALITY_REFRESH_INTERVAL", "30"))
+
+
+class RealityStore:
+    """
+    Активная версия Reality-параметров из таблицы reality_keys.
+    Читается фоновым потоком раз в REALITY_REFRESH_INTERVAL секунд,
+    так что build_vless_link не ходит в БД. Пока версий нет — None,
+    и ссылки собираются из REALITY_* env, как раньше.
+    """
+
+    def __init__(self, interval: float = REALITY_REFRESH_INTERVAL):
+        self.interval = interval
+        self._active: dict | None = None
+        self._listeners = []
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def active(self) -> dict | None:
+        return self._active
+
+    def on_change(self, fn):
+        self._listeners.append(fn)
+
+    def refresh(self):
+        db = SessionLocal()
+        try:
+            key = db.scalar(select(RealityKey).where(RealityKey.is_active.is_(True)))
+        finally:
+            db.close()
+
+        new = None
+        if key is not None:
+            new = {"version": key.version, "pbk": key.pbk, "sid": key.sid, "sni": key.sni, "fp": key.fp, "spx": key.spx}
+
+        old = self._active
+        self._active = new
+        if (old or {}).get("version") != (new or {}).get("version"):
+            for fn in self._listeners:
+                fn()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Дождаться первой попытки чтения (удачной или нет), не дольше timeout."""
+        return self._ready.wait(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                # БД ещё не поднялась — пока берём env, подтянем версию на следующем круге
+                pass
+            self._ready.set()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        # первое чтение — уже в потоке: старт процесса не ждёт БД
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="reality-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+store = RealityStore()
@@ -0,0 +1,69 @@
+"""
+Ротация Reality-ключей: новая версия в reality_keys становится активной,
+и ставится рассылка новых ссылок всем пользователям (её выполняет бот).
+
+Сначала поменяй ключи инбаунда в панели x-ui, потом:
+
+    docker compose exec backend python -m app.rotate_reality \\
+        --pbk <public key> --sid <short id> [--sni ...] [--no-notify]
+
+Воркеры backend подхватят новую версию за REALITY_REFRESH_INTERVAL секунд.
+"""
+import argparse
+import os
+
+from sqlalchemy import func, select, update
+
+from . import events
+from .database import SessionLocal
+from .models import BroadcastJob, RealityKey
+
+
+def rotate(pbk: str, sid: str, sni: str, fp: str, spx: str, notify: bool = True) -> tuple[int, int | None]:
+    db = SessionLocal()
+    try:
+        # сериализуем параллельные ротации
+        db.execute(select(func.pg_advisory_xact_lock(0x5EA1)))
+
+        version = (db.scalar(select(func.max(RealityKey.version))) or 0) + 1
+        db.execute(update(RealityKey).where(RealityKey.is_active.is_(True)).values(is_active=False))
+        db.flush()
+        db.add(RealityKey(version=version, pbk=pbk, sid=sid, sni=sni, fp=fp, spx=spx, is_active=True))
+
+        job_id = None
+        if notify:
+            job = BroadcastJob(kind="reality_rotation", reality_version=version, status="pending", cursor=0, sent=0, failed=0)
+            db.add(job)
+            db.flush()
+            job_id = job.id
+
+        db.commit()
+        return version, job_id
+    finally:
+        db.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rotate Reality keys and notify users")
+    ap.add_argument("--pbk", required=True)
+    ap.add_argument("--sid", required=True)
+    ap.add_argument("--sni", default=os.getenv("REALITY_SNI", ""))
+    ap.add_argument("--fp", default=os.getenv("REALITY_FP", "chrome") or "chrome")
+    ap.add_argument("--spx", default=os.getenv("REALITY_SPX", "/") or "/")
+    ap.add_argument("--no-notify", action="store_true", help="не рассылать новые ссылки")
+    args = ap.parse_args()
+
+    if not args.sni:
+        ap.error("--sni is required (REALITY_SNI is not set)")
+
+    version, job_id = rotate(args.pbk, args.sid, args.sni, args.fp, args.spx, notify=not args.no_notify)
+    # CLI живёт секунду — фоновый поток не нужен, пишем сразу
+    events.emit("admin.rotate_reality", version=version, broadcast_job_id=job_id)
+    events.writer.flush()
+    print(f"active Reality version: {version}")
+    if job_id is not None:
+        print(f"broadcast job queued: #{job_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Literal
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from sqlalchemy import select
+
+from .database import AsyncSessionLocal, engine
+from .models import User
+from .reality import store as reality_store
+from .vless import Node, build_vless_link, reality_params, vpn_nodes
+
+# через сколько часов клиент сам перезапросит подписку
+SUB_UPDATE_INTERVAL_HOURS = os.getenv("SUB_UPDATE_INTERVAL_HOURS", "1")
+# TTL с запасом больше интервала опроса — иначе почти каждый плановый опрос
+# клиента промахивался бы мимо кеша; свежесть держат явные put/rerender
+SUB_CACHE_TTL = float(os.getenv("SUB_CACHE_TTL") or float(SUB_UPDATE_INTERVAL_HOURS) * 3600 * 2)
+SUB_CACHE_MAX = int(os.getenv("SUB_CACHE_MAX", "100000"))
+# сколько подписок отрендерить заранее при старте (свежие пользователи первыми)
+SUB_CACHE_WARM = int(os.getenv("SUB_CACHE_WARM", "10000"))
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").strip().rstrip("/")
+
+router = APIRouter()
+
+FORMATS = {
+    "base64": "text/plain; charset=utf-8",
+    "singbox": "application/json",
+    "clash": "text/yaml; charset=utf-8",
+}
+
+
+CLASH_GROUP = "Proxy"
+
+
+def subscription_url(token: str) -> str | None:
+    if not PUBLIC_BASE_URL:
+        return None
+    return f"{PUBLIC_BASE_URL}/sub/{token}"
+
+
+# ---- renderers ----
+
+def render_base64(uuid: str, nodes: list[Node], params: dict) -> str:
+    links = "\n".join(build_vless_link(uuid, node, params) for node in nodes)
+    return base64.b64encode(links.encode()).decode()
+
+
+def render_singbox(uuid: str, nodes: list[Node], params: dict) -> str:
+    outbounds = [
+        {
+            "type": "vless",
+            "tag": node.name,
+            "server": node.host,
+            "server_port": node.port,
+            "uuid": uuid,
+            "flow": "xtls-rprx-vision",
+            "tls": {
+                "enabled": True,
+                "server_name": params["sni"],
+                "utls": {"enabled": True, "fingerprint": params["fp"]},
+                "reality": {"enabled": True, "public_key": params["pbk"], "short_id": params["sid"]},
+            },
+        }
+        for node in nodes
+    ]
+    tags = [o["tag"] for o in outbounds]
+    config = {
+        # tun: клиент (SFA/SFI/Hiddify) заворачивает в профиль весь трафик устройства
+        "inbounds": [
+            {
+                "type": "tun",
+                "tag": "tun-in",
+                "address": ["172.19.0.1/30"],
+                "auto_route": True,
+                "strict_route": True,
+            }
+        ],
+        "dns": {
+            "servers": [{"tag": "remote", "address": "tls://1.1.1.1", "detour": "proxy"}],
+            "final": "remote",
+        },
+        "outbounds": [
+            {"type": "selector", "tag": "proxy", "outbounds": ["auto", *tags]},
+            {"type": "urltest", "tag": "auto", "outbounds": tags},
+            *outbounds,
+            {"type": "direct", "tag": "direct"},
+        ],
+        "route": {"auto_detect_interface": True, "final": "proxy"},
+    }
+    return json.dumps(config, ensure_ascii=False, indent=2)
+
+
+def render_clash(uuid: str, nodes: list[Node], params: dict) -> str:
+    # YAML руками, чтобы не тянуть pyyaml ради одного шаблона
+    q = json.dumps  # JSON-строка — валидный YAML-скаляр с экранированием
+    lines = ["proxies:"]
+    for node in nodes:
+        lines += [
+            f"  - name: {q(node.name)}",
+            "    type: vless",
+            f"    server: {q(node.host)}",
+            f"    port: {node.port}",
+            f"    uuid: {q(uuid)}",
+            "    network: tcp",
+            "    udp: true",
+            "    tls: true",
+            "    flow: xtls-rprx-vision",
+            f"    servername: {q(params['sni'])}",
+            f"    client-fingerprint: {q(params['fp'])}",
+            "    reality-opts:",
+            f"      public-key: {q(params['pbk'])}",
+            f"      short-id: {q(params['sid'])}",
+        ]
+    names = ", ".join(q(node.name) for node in nodes)
+    # имя группы не должно совпадать с именем прокси (узел по умолчанию — "AronxVPN"),
+    # иначе mihomo не загрузит конфиг
+    lines += [
+        "proxy-groups:",
+        f"  - name: {q(CLASH_GROUP)}",
+        "    type: select",
+        f"    proxies: [{names}]",
+        "rules:",
+        f"  - MATCH,{CLASH_GROUP}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+RENDERERS = {
+    "base64": render_base64,
+    "singbox": render_singbox,
+    "clash": render_clash,
+}
+
+
+# ---- cache ----
+
+class SubscriptionCache:
+    """
+    token -> отрендеренные тела всех форматов + их ETag.
+    Запрос с совпавшим If-None-Match отвечает 304 прямо из кеша, без БД.
+    LRU с TTL. Сброс/регистрация перезаписывают запись (put), ротация Reality
+    перерендеривает все закешированные подписки (rerender); TTL лишь
+    ограничивает рассинхрон, если воркеров несколько.
+    """
+
+    def __init__(self, ttl: float = SUB_CACHE_TTL, max_size: int = SUB_CACHE_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        with self._lock:
+            item = self._data.get(token)
+            if item is None:
+                return None
+            expires, _, bodies = item
+            if expires < time.monotonic():
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return bodies
+
+    @staticmethod
+    def _render(uuid: str, nodes: list[Node], params: dict) -> dict:
+        bodies = {}
+        for fmt, render in RENDERERS.items():
+            body = render(uuid, nodes, params).encode()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            bodies[fmt] = (body, etag)
+        return bodies
+
+    def put(self, token: str, uuid: str) -> dict:
+        bodies = self._render(uuid, vpn_nodes(), reality_params())
+        with self._lock:
+            self._data[token] = (time.monotonic() + self.ttl, uuid, bodies)
+            self._data.move_to_end(token)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return bodies
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._data.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def rerender(self):
+        """Новые Reality-ключи: перерендерить всё, что в кеше, а не выбрасывать."""
+        nodes = vpn_nodes()
+        params = reality_params()
+        with self._lock:
+            entries = [(token, uuid) for token, (_, uuid, _) in self._data.items()]
+        for token, uuid in entries:
+            bodies = self._render(uuid, nodes, params)
+            with self._lock:
+                item = self._data.get(token)
+                # пока рендерили, запись могли вытеснить или перезаписать новым uuid (me_reset)
+                if item is None or item[1] != uuid:
+                    continue
+                self._data[token] = (item[0], uuid, bodies)
+
+    def warm(self, limit: int = SUB_CACHE_WARM):
+        """Отрендерить подписки заранее, чтобы первый опрос клиента не шёл в БД."""
+        if limit <= 0:
+            return
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(User.sub_token, User.vpn_uuid).order_by(User.id.desc()).limit(limit)
+            )
+            for token, uuid in rows:
+                if self.get(token) is None:
+                    self.put(token, uuid)
+
+
+def warm_in_background():
+    def run():
+        try:
+            cache.warm()
+        except Exception as e:
+            print(f"subscription cache: warm-up failed: {e}", file=sys.stderr)
+
+    threading.Thread(target=run, name="sub-cache-warm", daemon=True).start()
+
+
+cache = SubscriptionCache()
+# новые Reality-ключи — закешированные тела устарели, рендерим заново
+reality_store.on_change(cache.rerender)
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in candidates
+
+
+@router.get("/sub/{token}")
+async def get_subscription(
+    token: str,
+    format: Literal["base64", "singbox", "clash"] = "base64",
+    if_none_match: str | None = Header(default=None),
+):
+    bodies = cache.get(token)
+    if bodies is None:
+        async with AsyncSessionLocal() as db:
+            vpn_uuid = await db.scalar(select(User.vpn_uuid).where(User.sub_token == token))
+        if not vpn_uuid:
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        bodies = cache.put(token, vpn_uuid)
+
+    body, etag = bodies[format]
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "profile-update-interval": SUB_UPDATE_INTERVAL_HOURS,
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=FORMATS[format], headers=headers)
@@ -1,4 +1,21 @@
+import os
 import uuid
 
+from fastapi import HTTPException
+
+
 def generate_vpn_uuid():
     return str(uuid.uuid4())
+
+
+def get_env(name: str) -> str:
+    v = os.getenv(name)
+    if v is None or str(v).strip() == "":
+        raise HTTPException(status_code=500, detail=f"Missing env var: {name}")
+    return str(v).strip()
+
+
+def require_admin(x_admin_token: str | None):
+    admin_token = get_env("ADMIN_TOKEN")
+    if not x_admin_token or x_admin_token != admin_token:
+        raise HTTPException(status_code=401, detail="Unauthorized")
@@ -0,0 +1,95 @@
+import os
+import urllib.parse
+from dataclasses import dataclass
+
+from .utils import get_env
+from .reality import store as reality_store
+
+
+@dataclass(frozen=True)
+class Node:
+    name: str
+    host: str
+    port: int
+
+
+def _pick_reality_sid(raw: str) -> str:
+    parts = [p.strip() for p in raw.split(",") if p.strip()]
+    return parts[0] if parts else raw.strip()
+
+
+def params_from_key(key) -> dict:
+    """Параметры ссылки из версии ключа: строка RealityKey или dict из reality_store.active()."""
+    if not isinstance(key, dict):
+        key = {f: getattr(key, f) for f in ("pbk", "sid", "sni", "fp", "spx")}
+    return {
+        "pbk": key["pbk"],
+        "sid": _pick_reality_sid(key["sid"]),
+        "sni": key["sni"],
+        "fp": key["fp"],
+        "spx": key["spx"],
+    }
+
+
+def reality_params() -> dict:
+    # активная версия из reality_keys (app.rotate_reality), иначе REALITY_* из env
+    active = reality_store.active()
+    if active is not None:
+        return params_from_key(active)
+
+    sid_raw = get_env("REALITY_SID")
+    return {
+        "pbk": get_env("REALITY_PBK"),
+        "sid": _pick_reality_sid(sid_raw),
+        "sni": get_env("REALITY_SNI"),
+        "fp": os.getenv("REALITY_FP", "chrome").strip() or "chrome",
+        # spiderX (в панели у тебя "/")
+        "spx": os.getenv("REALITY_SPX", "/").strip() or "/",
+    }
+
+
+def vpn_nodes() -> list[Node]:
+    """
+    VPN_NODES="NL=1.2.3.4:443,DE=5.6.7.8:443" — список серверов для подписки.
+    Если не задан — один узел из VPN_SERVER_IP/VPN_SERVER_PORT.
+    """
+    raw = os.getenv("VPN_NODES", "").strip()
+    if not raw:
+        return [Node("AronxVPN", get_env("VPN_SERVER_IP"), int(get_env("VPN_SERVER_PORT")))]
+
+    nodes = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, addr = item.rpartition("=")
+        host, _, port = addr.rpartition(":")
+        nodes.append(Node(name or host, host, int(port)))
+    return nodes
+
+
+def build_vless_link(uuid: str, node: Node | None = None, params: dict | None = None) -> str:
+    if node is None:
+        node = Node("AronxVPN", get_env("VPN_SERVER_IP"), int(get_env("VPN_SERVER_PORT")))
+    p = params or reality_params()
+
+    pbk_q = urllib.parse.quote(p["pbk"], safe="")
+    sid_q = urllib.parse.quote(p["sid"], safe="")
+    sni_q = urllib.parse.quote(p["sni"], safe="")
+    fp_q = urllib.parse.quote(p["fp"], safe="")
+    spx_q = urllib.parse.quote(p["spx"], safe="")
+    name_q = urllib.parse.quote(node.name, safe="")
+
+    return (
+        f"vless://{uuid}@{node.host}:{node.port}/"
+        f"?type=tcp"
+        f"&encryption=none"
+        f"&security=reality"
+        f"&pbk={pbk_q}"
+        f"&fp={fp_q}"
+        f"&sni={sni_q}"
+        f"&sid={sid_q}"
+        f"&spx={spx_q}"
+        f"&flow=xtls-rprx-vision"
+        f"#{name_q}"
+    )
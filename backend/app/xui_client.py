@@ -1,7 +1,11 @@
 import os
 import json
+import time
 import requests
 
+from .breaker import CircuitOpen, get_breaker
+from .tracing import span
+
 XUI_BASE_URL = os.getenv("XUI_BASE_URL", "").rstrip("/")
 XUI_USERNAME = os.getenv("XUI_USERNAME", "")
 XUI_PASSWORD = os.getenv("XUI_PASSWORD", "")
@@ -10,14 +14,38 @@ XUI_INBOUND_ID = int(os.getenv("XUI_INBOUND_ID", "1"))
 session = requests.Session()
 
 
-def _req(method: str, url: str, **kwargs):
-    return session.request(method, url, timeout=10, **kwargs)
+def _req(method: str, url: str, *, endpoint: str, adaptive: bool = True, **kwargs):
+    """
+    Запрос к панели через circuit breaker эндпоинта `endpoint`.
+    Таймаут подстраивается под наблюдаемую латентность этого эндпоинта,
+    сетевые ошибки и 5xx считаются отказами, 4xx — нет (это ответ панели).
+    adaptive=False — неидемпотентный вызов, таймаут всегда XUI_TIMEOUT_MAX.
+    """
+    breaker = get_breaker(endpoint, adaptive=adaptive)
+    with span(f"xui.{endpoint}", method=method) as attrs:
+        attrs["breaker"] = breaker.state
+        breaker.before_call()
+        timeout = breaker.timeout()
+        attrs["timeout"] = round(timeout, 2)
+        started = time.monotonic()
+        try:
+            r = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            breaker.record_failure()
+            raise
+        attrs["status_code"] = r.status_code
+        if r.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(time.monotonic() - started)
+        return r
 
 
 def login():
     r = _req(
         "POST",
         f"{XUI_BASE_URL}/login",
+        endpoint="login",
         data={"username": XUI_USERNAME, "password": XUI_PASSWORD},
     )
     if r.status_code != 200:
@@ -27,6 +55,20 @@ def login():
         raise Exception(f"Login failed: {j}")
 
 
+def get_inbound() -> dict:
+    """
+    Список клиентов инбаунда одним запросом:
+      GET /panel/api/inbounds/get/{id}
+    """
+    r = _req("GET", f"{XUI_BASE_URL}/panel/api/inbounds/get/{XUI_INBOUND_ID}", endpoint="getInbound")
+    if r.status_code != 200:
+        raise Exception(f"getInbound HTTP {r.status_code}: {r.text[:200]}")
+    j = r.json()
+    if not j.get("success"):
+        raise Exception(f"getInbound failed: {j}")
+    return j.get("obj") or {}
+
+
 def add_client(uuid: str):
     """
     ТОЛЬКО рабочий путь для твоей сборки:
@@ -49,7 +91,7 @@ def add_client(uuid: str):
         "settings": json.dumps(settings, ensure_ascii=False),
     }
 
-    r = _req("POST", f"{XUI_BASE_URL}/panel/api/inbounds/addClient", json=payload)
+    r = _req("POST", f"{XUI_BASE_URL}/panel/api/inbounds/addClient", endpoint="addClient", adaptive=False, json=payload)
     if r.status_code != 200:
         raise Exception(f"addClient HTTP {r.status_code}: {r.text[:400]}")
 
@@ -62,79 +104,83 @@ def add_client(uuid: str):
         pass
 
 
-def delete_client(uuid: str):
-    """
-    Самая стабильная ручка удаления (у тебя она работает):
-      POST /panel/api/inbounds/{id}/delClient/{uuid}
-    """
-    url = f"{XUI_BASE_URL}/panel/api/inbounds/{XUI_INBOUND_ID}/delClient/{uuid}"
-    r = _req("POST", url)
+def create_vpn(uuid: str):
+    with span("xui.create_vpn"):
+        login()
+        add_client(uuid)
+
+
+# ручки удаления, которые встречаются в разных сборках 3x-ui
+DELETE_CANDIDATES = [
+    ("delClient/{uuid}", lambda uuid: (f"/panel/api/inbounds/{XUI_INBOUND_ID}/delClient/{uuid}", None)),
+    ("delClient:id+clientId", lambda uuid: ("/panel/api/inbounds/delClient", {"id": XUI_INBOUND_ID, "clientId": uuid})),
+    ("delClient:clientId", lambda uuid: ("/panel/api/inbounds/delClient", {"clientId": uuid})),
+    ("removeClient:id+clientId", lambda uuid: ("/panel/api/inbounds/removeClient", {"id": XUI_INBOUND_ID, "clientId": uuid})),
+    ("removeClient:clientId", lambda uuid: ("/panel/api/inbounds/removeClient", {"clientId": uuid})),
+]
+
+# какая ручка удаления работает на этой панели (выясняется при первом удалении)
+_learned_delete: str | None = None
+
+
+class EndpointMissing(Exception):
+    pass
+
+
+def _try_delete(name: str, uuid: str):
+    path, payload = dict(DELETE_CANDIDATES)[name](uuid)
+    r = _req("POST", f"{XUI_BASE_URL}{path}", endpoint=name, json=payload)
+    if r.status_code == 404:
+        raise EndpointMissing(f"{path} HTTP 404")
     if r.status_code != 200:
-        raise Exception(f"delClient HTTP {r.status_code}: {r.text[:400]}")
+        raise Exception(f"{path} HTTP {r.status_code}: {r.text[:200]}")
     try:
         j = r.json()
-        if j.get("success") is False:
-            raise Exception(f"delClient failed: {j}")
     except Exception:
-        pass
-
-
-def create_vpn(uuid: str):
-    login()
-    add_client(uuid)
+        # если ответ не JSON, но 200 — не валимся
+        return
+    if j.get("success") is False:
+        raise Exception(f"{path} failed: {j}")
 
 
 def remove_vpn(uuid: str):
     """
-    Старая логика удаления оставлена, но приоритетно используем delClient/{uuid}.
+    Первая же ручка, которая ответила не 404, запоминается, дальше
+    удаляем только через неё. Остальные пробуем заново, лишь если
+    запомненная начала отвечать 404 (панель обновили).
     """
-    login()
+    with span("xui.remove_vpn") as attrs:
+        _remove_vpn(uuid, attrs)
 
-    # 1) самый правильный и стабильный вариант
-    try:
-        delete_client(uuid)
-        return
-    except Exception:
-        pass
 
-    # 2) fallback на “плавающие” ручки (если вдруг появятся)
-    candidates = [
-        ("/panel/api/inbounds/delClient", {"id": XUI_INBOUND_ID, "clientId": uuid}),
-        ("/panel/api/inbounds/delClient", {"clientId": uuid}),
-        ("/panel/api/inbounds/removeClient", {"id": XUI_INBOUND_ID, "clientId": uuid}),
-        ("/panel/api/inbounds/removeClient", {"clientId": uuid}),
-    ]
+def _remove_vpn(uuid: str, attrs: dict):
+    global _learned_delete
+    login()
+
+    if _learned_delete:
+        attrs["endpoint"] = _learned_delete
+        try:
+            _try_delete(_learned_delete, uuid)
+            return
+        except EndpointMissing:
+            _learned_delete = None
 
     last_err = None
-    for path, payload in candidates:
-        r = _req("POST", f"{XUI_BASE_URL}{path}", json=payload)
-        if r.status_code != 200:
-            last_err = f"{path} HTTP {r.status_code}: {r.text[:200]}"
-            continue
+    for name, _ in DELETE_CANDIDATES:
+        attrs["endpoint"] = name
         try:
-            j = r.json()
-            if j.get("success") is False:
-                last_err = f"{path} failed: {j}"
-                continue
+            _try_delete(name, uuid)
+        except EndpointMissing as e:
+            last_err = str(e)
+            continue
+        except (requests.RequestException, CircuitOpen):
+            # панель тормозит/недоступна — перебор остальных ручек только умножит ожидание
+            raise
         except Exception:
-            pass
+            # ручка есть, но удалить не смогла — запоминаем её и не перебираем остальные
+            _learned_delete = name
+            raise
+        _learned_delete = name
         return
 
     raise Exception(last_err or "remove client failed")
-
-
-def reset_vpn(old_uuid: str, new_uuid: str):
-    """
-    RESET без update:
-      - пытаемся удалить старый (если не удалился — не валимся)
-      - добавляем новый (это главное)
-    """
-    login()
-
-    if old_uuid:
-        try:
-            delete_client(old_uuid)
-        except Exception:
-            pass
-
-    add_client(new_uuid)
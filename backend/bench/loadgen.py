@@ -0,0 +1,65 @@
+"""
+Простой нагрузочный харнесс: N запросов с заданной конкурентностью,
+на выходе rps и перцентили латентности. Работает и с живым сервером
+(base_url), и in-process через ASGITransport.
+"""
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    make_request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    total: int,
+    concurrency: int,
+) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            try:
+                r = await make_request(client, i)
+                if r.status_code >= 500:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def format_row(name: str, stats: dict) -> str:
+    return (
+        f"{name:<10} {stats['rps']:>9.0f} {stats['p50_ms']:>9.1f} "
+        f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['errors']:>7}"
+    )
+
+
+HEADER = f"{'variant':<10} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
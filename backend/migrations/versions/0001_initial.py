@@ -0,0 +1,54 @@
+"""initial schema: users, invite_codes
+
+Таблицы раньше создавались через Base.metadata.create_all при старте,
+поэтому на существующих инсталляциях они уже есть — тогда ничего не делаем.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("telegram_id", sa.String(), nullable=False),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("vpn_uuid", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_telegram_id", "users", ["telegram_id"], unique=True)
+        op.create_index("ix_users_vpn_uuid", "users", ["vpn_uuid"], unique=True)
+
+    if not inspector.has_table("invite_codes"):
+        op.create_table(
+            "invite_codes",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("code", sa.String(), nullable=False),
+            sa.Column("is_used", sa.Boolean(), nullable=False),
+            sa.Column("used_by_telegram_id", sa.String(), nullable=True),
+            sa.Column("used_by_username", sa.String(), nullable=True),
+            sa.Column("used_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.UniqueConstraint("code", name="uq_invite_code"),
+        )
+        op.create_index("ix_invite_codes_id", "invite_codes", ["id"])
+        op.create_index("ix_invite_codes_code", "invite_codes", ["code"], unique=True)
+
+
+def downgrade():
+    op.drop_table("invite_codes")
+    op.drop_table("users")
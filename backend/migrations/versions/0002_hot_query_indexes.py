@@ -0,0 +1,35 @@
+"""indexes for admin listings and unused invites
+
+CONCURRENTLY — чтобы не блокировать запись в большие таблицы на живой базе.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_users_created_at", "users (created_at)"),
+    ("ix_invite_codes_is_used_created_at", "invite_codes (is_used, created_at)"),
+    ("ix_invite_codes_unused_created_at", "invite_codes (created_at) WHERE is_used = false"),
+    ("ix_invite_codes_unused_id", "invite_codes (id) WHERE is_used = false"),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, target in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,34 @@
+"""pattern_ops indexes for username prefix search in admin listings
+
+Обычный btree не используется для LIKE 'abc%' при не-C collation,
+поэтому нужен varchar_pattern_ops.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_users_username_prefix", "users (username varchar_pattern_ops)"),
+    ("ix_invite_codes_used_by_username_prefix", "invite_codes (used_by_username varchar_pattern_ops)"),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, target in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
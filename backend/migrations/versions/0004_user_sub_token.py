@@ -0,0 +1,36 @@
+"""users.sub_token for /sub/{token} subscriptions
+
+Существующим пользователям генерируем токен в БД: два gen_random_uuid()
+(встроен с PostgreSQL 13, криптостойкий) = 244 случайных бита.
+Уникальный индекс — CONCURRENTLY, как в 0002: не блокировать запись в users.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("sub_token", sa.String(), nullable=True))
+    op.execute(
+        "UPDATE users SET sub_token = "
+        "replace(gen_random_uuid()::text, '-', '') || replace(gen_random_uuid()::text, '-', '') "
+        "WHERE sub_token IS NULL"
+    )
+    op.alter_column("users", "sub_token", nullable=False)
+    with op.get_context().autocommit_block():
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_sub_token ON users (sub_token)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_sub_token")
+    op.drop_column("users", "sub_token")
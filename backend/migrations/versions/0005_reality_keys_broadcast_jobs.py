@@ -0,0 +1,57 @@
+"""reality_keys (versioned Reality params) and broadcast_jobs
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "reality_keys",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, unique=True),
+        sa.Column("pbk", sa.String(), nullable=False),
+        sa.Column("sid", sa.String(), nullable=False),
+        sa.Column("sni", sa.String(), nullable=False),
+        sa.Column("fp", sa.String(), nullable=False),
+        sa.Column("spx", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index(
+        "uq_reality_keys_active", "reality_keys", ["is_active"],
+        unique=True, postgresql_where=sa.text("is_active"),
+    )
+
+    op.create_table(
+        "broadcast_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("reality_version", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("cursor", sa.Integer(), nullable=False),
+        sa.Column("sent", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "ix_broadcast_jobs_open", "broadcast_jobs", ["id"],
+        postgresql_where=sa.text("status IN ('pending', 'running')"),
+    )
+
+
+def downgrade():
+    op.drop_table("broadcast_jobs")
+    op.drop_table("reality_keys")
@@ -0,0 +1,29 @@
+"""broadcast_deliveries: per-user delivery log of broadcast jobs
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "broadcast_deliveries",
+        sa.Column("job_id", sa.Integer(), sa.ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("broadcast_deliveries")
@@ -0,0 +1,49 @@
+"""events: append-only audit log partitioned by month
+
+Секции создаёт app.events (текущий и следующий месяц) — и при старте,
+и раз в час из фонового потока. Здесь создаём только текущую и следующую.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE SEQUENCE IF NOT EXISTS events_id_seq")
+    op.execute("""
+        CREATE TABLE events (
+            id BIGINT NOT NULL DEFAULT nextval('events_id_seq'),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            kind VARCHAR NOT NULL,
+            telegram_id VARCHAR,
+            vpn_uuid VARCHAR,
+            data JSONB,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events.id")
+    op.execute("CREATE INDEX ix_events_telegram_id_created_at ON events (telegram_id, created_at)")
+
+    now = datetime.now(timezone.utc)
+    start = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    for _ in range(2):
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS events_{start:%Y_%m} PARTITION OF events "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        start = end
+
+
+def downgrade():
+    op.execute("DROP TABLE events")
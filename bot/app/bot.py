@@ -4,10 +4,10 @@ import asyncio
 from typing import Optional, Tuple, Dict
 
 import httpx
-import qrcode
 
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -18,6 +18,9 @@ from aiogram.types import (
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
+from broadcast import BroadcastWorker, Rejected, RetryAfter, Undeliverable
+import tracing
+
 
 # =========================
 # ENV
@@ -33,7 +36,7 @@ PUBLIC_APP_URL = os.getenv("PUBLIC_APP_URL", "").strip()  # оставляем 
 API_USE_INVITE = f"{API_BASE}/invite/use"
 API_ME = f"{API_BASE}/me"
 API_ADMIN_INVITE = f"{API_BASE}/admin/create-invite"
-API_HEALTH_DB = f"{API_BASE}/health/db"  # ✅ статус сервиса
+API_HEALTH = f"{API_BASE}/health"  # ✅ статус сервиса (кешированная проверка БД + x-ui)
 
 # ✅ ДОБАВИЛ: endpoint на сброс/пересоздание VPN (тебе надо добавить его в backend)
 API_RESET = f"{API_BASE}/me/reset"
@@ -49,6 +52,15 @@ dp = Dispatcher()
 router = Router()
 dp.include_router(router)
 
+
+# ✅ каждый апдейт — новый трейс; его id уходит в backend через api_json
+@dp.update.outer_middleware()
+async def trace_update(handler, event, data):
+    tracing.start_trace(None, None)
+    user = data.get("event_from_user")
+    with tracing.span(f"update {event.event_type}", update_id=event.update_id, user_id=user.id if user else None):
+        return await handler(event, data)
+
 HTTP_TIMEOUT = 15.0
 
 
@@ -107,6 +119,9 @@ def kb_confirm_reset(telegram_id: int) -> InlineKeyboardMarkup:
 
 
 def make_qr_png_bytes(text: str) -> bytes:
+    # qrcode + Pillow нужны только для кнопки QR — не тянем их при старте бота
+    import qrcode
+
     qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2)
     qr.add_data(text)
     qr.make(fit=True)
@@ -195,16 +210,22 @@ async def api_json(
     *,
     params: Optional[dict] = None,
     headers: Optional[dict] = None,
+    json: Optional[dict] = None,
 ) -> Tuple[int, Dict]:
     last_err = None
 
     for try_url in _fallback_urls(url):
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-            try:
-                r = await client.request(method, try_url, params=params, headers=headers)
-            except httpx.RequestError as e:
-                last_err = f"{e.__class__.__name__} while requesting {try_url}"
-                continue
+        with tracing.span(f"api {method} /{try_url.split('://', 1)[-1].split('/', 1)[-1]}", url=try_url) as attrs:
+            # parent для спанов backend — этот спан
+            req_headers = {**(headers or {}), **tracing.propagation_headers()}
+            async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
+                try:
+                    r = await client.request(method, try_url, params=params, headers=req_headers, json=json)
+                except httpx.RequestError as e:
+                    last_err = f"{e.__class__.__name__} while requesting {try_url}"
+                    attrs["error"] = last_err
+                    continue
+            attrs["status_code"] = r.status_code
 
         try:
             data = r.json()
@@ -218,15 +239,31 @@ async def api_json(
     return 0, {"detail": last_err or "Network error", "_debug_url": url}
 
 
+async def _admin_api(
+    method: str, path: str, params: Optional[dict] = None, json: Optional[dict] = None
+) -> Tuple[int, Dict]:
+    return await api_json(
+        method, f"{API_BASE}{path}", params=params, json=json, headers={"X-Admin-Token": ADMIN_TOKEN}
+    )
+
+
 # =========================
 # Core actions
 # =========================
-async def send_vpn_link_only(message: Message, link: str, title: str):
+async def send_vpn_link_only(message: Message, link: str, title: str, sub_url: Optional[str] = None):
+    sub_block = ""
+    if sub_url:
+        # подписка сама подтянет новые ключи/серверы — импортировать заново не придётся
+        sub_block = (
+            "🔁 *Подписка (лучше добавить её — обновляется сама):*\n"
+            f"`{sub_url}`\n\n"
+        )
     await message.answer(
         (
             f"{title}\n\n"
             "📎 *Ссылка (скопируй и импортируй в клиент):*\n"
             f"`{link}`\n\n"
+            f"{sub_block}"
             "📷 QR-код — по кнопке ниже."
         ),
         parse_mode="Markdown",
@@ -285,7 +322,7 @@ async def send_my_vpn(message: Message, telegram_id: int):
         await message.answer("⚠️ Не смог получить ссылку. Напиши в поддержку.", reply_markup=kb_back(telegram_id))
         return
 
-    await send_vpn_link_only(message, link, "📌 *Твой VPN:*")
+    await send_vpn_link_only(message, link, "📌 *Твой VPN:*", data.get("subscription_url"))
 
 
 async def use_invite_and_send(message: Message, code: str):
@@ -333,7 +370,7 @@ async def use_invite_and_send(message: Message, code: str):
 
     existing = data.get("existing", False)
     title = "✅ *Готово!* Ты уже был зарегистрирован — вот твой VPN снова:" if existing else "✅ *Готово!* Подключение создано:"
-    await send_vpn_link_only(message, link, title)
+    await send_vpn_link_only(message, link, title, data.get("subscription_url"))
 
 
 async def admin_create_invite(message: Message, requester_id: Optional[int] = None):
@@ -415,7 +452,7 @@ async def reset_my_vpn(message: Message, telegram_id: int):
         await message.answer("⚠️ Backend вернул странный ответ. Напиши в поддержку.", reply_markup=kb_back(telegram_id))
         return
 
-    await send_vpn_link_only(message, link, "🔄 *VPN сброшен.* Вот новый доступ:")
+    await send_vpn_link_only(message, link, "🔄 *VPN сброшен.* Вот новый доступ:", data.get("subscription_url"))
 
 
 # =========================
@@ -453,6 +490,65 @@ async def cmd_invite(message: Message):
     await admin_create_invite(message, requester_id=message.from_user.id)
 
 
+# ✅ ДОБАВИЛ: рассылка всем пользователям (выполняет BroadcastWorker в фоне)
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message):
+    requester_id = message.from_user.id
+    if not is_admin_user(requester_id) or not ADMIN_TOKEN:
+        await message.answer("⛔ Нет доступа.", reply_markup=kb_back(requester_id))
+        return
+
+    parts = (message.text or "").split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await message.answer(
+            "📣 Использование: `/broadcast <текст>`\n\n"
+            "Текст уйдёт всем пользователям как есть, без разметки.\n"
+            "Статус: `/broadcast_status <id>`",
+            parse_mode="Markdown",
+            reply_markup=kb_back(requester_id),
+        )
+        return
+
+    status, data = await _admin_api("POST", "/admin/broadcast", {"text": parts[1].strip()})
+    if status != 200:
+        await message.answer(f"❌ Не удалось создать рассылку: {data.get('detail', data)}", reply_markup=kb_back(requester_id))
+        return
+
+    job_id = data["job"]["id"]
+    await message.answer(
+        f"📣 Рассылка #{job_id} поставлена в очередь.\n\nСтатус: `/broadcast_status {job_id}`",
+        parse_mode="Markdown",
+        reply_markup=kb_back(requester_id),
+    )
+
+
+@router.message(Command("broadcast_status"))
+async def cmd_broadcast_status(message: Message):
+    requester_id = message.from_user.id
+    if not is_admin_user(requester_id) or not ADMIN_TOKEN:
+        await message.answer("⛔ Нет доступа.", reply_markup=kb_back(requester_id))
+        return
+
+    parts = (message.text or "").split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip().isdigit():
+        await message.answer("Использование: `/broadcast_status <id>`", parse_mode="Markdown", reply_markup=kb_back(requester_id))
+        return
+
+    status, data = await _admin_api("GET", f"/admin/broadcast/{parts[1].strip()}")
+    if status != 200:
+        await message.answer(f"❌ {data.get('detail', data)}", reply_markup=kb_back(requester_id))
+        return
+
+    job = data["job"]
+    await message.answer(
+        f"📣 Рассылка #{job['id']} ({job['kind']})\n\n"
+        f"• Статус: {job['status']}\n"
+        f"• Доставлено: {job['sent']}\n"
+        f"• Не доставлено: {job['failed']}",
+        reply_markup=kb_back(requester_id),
+    )
+
+
 # =========================
 # Callbacks
 # =========================
@@ -480,7 +576,7 @@ async def cb_support(call: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "m:status")
 async def cb_status(call: CallbackQuery, state: FSMContext):
     await state.clear()
-    status, data = await api_json("GET", API_HEALTH_DB)
+    status, data = await api_json("GET", API_HEALTH)
 
     if status == 0:
         dbg = data.get("_debug_url", "")
@@ -494,7 +590,9 @@ async def cb_status(call: CallbackQuery, state: FSMContext):
         await call.answer()
         return
 
-    if status >= 400:
+    # 503 — это тоже валидный ответ /health (что-то деградировало), показываем компоненты
+    components = data.get("components")
+    if status >= 400 and components is None:
         dbg = data.get("_debug_url", "")
         await call.message.edit_text(
             f"❌ Ошибка backend: {data.get('detail', data)}\n\n🔎 Debug: `{dbg}`",
@@ -504,11 +602,19 @@ async def cb_status(call: CallbackQuery, state: FSMContext):
         await call.answer()
         return
 
-    db_state = data.get("database", "unknown")
-    detail = data.get("detail")
-    text = f"🩺 *Статус сервиса:*\n\n• Backend: ✅\n• DB: *{db_state}*"
-    if detail:
-        text += f"\n• Detail: `{detail}`"
+    names = {"database": "DB", "database_sync": "DB (sync)", "xui_login": "x-ui login", "xui_inbound": "x-ui inbound"}
+    text = "🩺 *Статус сервиса:*\n\n• Backend: ✅"
+    for key, comp in (components or {}).items():
+        mark = "✅" if comp.get("ok") else "❌"
+        text += f"\n• {names.get(key, key)}: {mark} ({comp.get('latency_ms')} ms)"
+        if comp.get("detail"):
+            detail = comp['detail'][:120].replace('`', "'")
+            text += f"\n  `{detail}`"
+    if not components:
+        text += "\n• Проверка ещё не завершена, попробуй через пару секунд."
+    age = data.get("age_seconds")
+    if age is not None:
+        text += f"\n\n🕒 Проверено {age:.0f} с назад"
     await call.message.edit_text(text, parse_mode="Markdown", reply_markup=kb_main(call.from_user.id))
     await call.answer()
 
@@ -589,8 +695,30 @@ async def invite_entered(message: Message, state: FSMContext):
 # =========================
 # Entrypoint
 # =========================
+async def _send_broadcast(chat_id: int, text: str, parse_mode: Optional[str] = None):
+    # переводим ошибки aiogram в понятные движку рассылки
+    try:
+        await bot.send_message(chat_id, text, parse_mode=parse_mode, reply_markup=kb_back(chat_id))
+    except TelegramRetryAfter as e:
+        raise RetryAfter(e.retry_after)
+    except TelegramForbiddenError as e:
+        raise Undeliverable(str(e))
+    except TelegramBadRequest as e:
+        if "chat not found" in str(e).lower():
+            raise Undeliverable(str(e))
+        raise Rejected(str(e))
+
+
 async def main():
-    await dp.start_polling(bot)
+    # ✅ рассылки (ротация ключей и т.п.) — фоном, только если есть доступ к админ-API
+    worker_task = None
+    if ADMIN_TOKEN:
+        worker_task = asyncio.create_task(BroadcastWorker(_admin_api, _send_broadcast).run_forever())
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if worker_task:
+            worker_task.cancel()
 
 if __name__ == "__main__":
     asyncio.run(main())
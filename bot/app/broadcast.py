@@ -0,0 +1,253 @@
+import os
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger("broadcast")
+
+# лимиты Telegram: ~30 сообщений/с на бота всего и ~1 сообщение/с в один чат
+BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", "25"))
+BROADCAST_CHAT_RATE = float(os.getenv("BROADCAST_CHAT_RATE", "1"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "100"))
+# как часто отчитываться backend'у о доставленных внутри пачки
+BROADCAST_FLUSH_EVERY = int(os.getenv("BROADCAST_FLUSH_EVERY", "25"))
+BROADCAST_POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", "10"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+# сколько RetryAfter подряд терпим на одном сообщении (в max_retries они не входят)
+BROADCAST_MAX_FLOOD_WAITS = int(os.getenv("BROADCAST_MAX_FLOOD_WAITS", "100"))
+
+# api(method, path, params, json) -> (status, data), поверх api_json из bot.py
+ApiCall = Callable[[str, str, Optional[dict], Optional[dict]], Awaitable[Tuple[int, Dict]]]
+# send(chat_id, text, parse_mode) — отправка одного сообщения; ошибки Telegram
+# переводятся вызывающим кодом в RetryAfter / Undeliverable / Rejected
+SendCall = Callable[[int, str, Optional[str]], Awaitable[None]]
+
+
+class RetryAfter(Exception):
+    """Telegram попросил подождать (429 Too Many Requests)."""
+
+    def __init__(self, seconds: float):
+        super().__init__(f"retry after {seconds}s")
+        self.seconds = seconds
+
+
+class Undeliverable(Exception):
+    """Доставить нельзя в принципе: бот заблокирован, чат удалён и т.п."""
+
+
+class Rejected(Exception):
+    """Telegram отверг само сообщение (400 Bad Request) — повтор не поможет."""
+
+
+def render_message(job: dict, item: dict) -> str:
+    if job["kind"] == "reality_rotation":
+        text = (
+            "🔄 *Мы обновили ключи VPN.*\n\n"
+            "Старая ссылка скоро перестанет работать. Импортируй новую:\n"
+            f"`{item['vless_link']}`"
+        )
+        if item.get("subscription_url"):
+            text += (
+                "\n\n🔁 Если добавишь подписку, такие обновления будут приходить сами:\n"
+                f"`{item['subscription_url']}`"
+            )
+        return text
+    return job.get("text") or ""
+
+
+def message_parse_mode(job: dict) -> Optional[str]:
+    # разметку шаблона ротации пишем сами; текст админа уходит как есть —
+    # один случайный "_" в нём ломал бы Markdown у каждого получателя
+    return "Markdown" if job["kind"] == "reality_rotation" else None
+
+
+class TokenBucket:
+    """
+    Классический token bucket: `rate` токенов в секунду, не больше `capacity`.
+    pause() — глобальная пауза (RetryAfter): до её конца токены не выдаются.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class ChatLimiter:
+    """Per-chat token bucket'ы; давно не использованные выкидываются."""
+
+    def __init__(self, rate: float, max_idle: float = 60.0):
+        self.rate = rate
+        self.max_idle = max_idle
+        self._buckets: Dict[int, TokenBucket] = {}
+
+    async def acquire(self, chat_id: int):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 10_000:
+                cutoff = time.monotonic() - self.max_idle
+                self._buckets = {k: b for k, b in self._buckets.items() if b.updated > cutoff}
+            bucket = self._buckets[chat_id] = TokenBucket(self.rate, capacity=1)
+        await bucket.acquire()
+
+
+class BroadcastWorker:
+    """
+    Выполняет рассылки из очереди backend (/admin/broadcast/*).
+
+    Получатели идут пачками по users.id. Внутри пачки отправка идёт
+    в BROADCAST_CONCURRENCY потоков через общий token bucket и per-chat лимит;
+    RetryAfter ставит на паузу всю рассылку и повторяет сообщение, не тратя
+    на это max_retries (тот — только на сетевые ошибки).
+    Результаты уходят в backend каждые BROADCAST_FLUSH_EVERY сообщений
+    (broadcast_deliveries), курсор двигается после целой пачки — после падения
+    бот продолжит с пачки, а уже доставленным повторно ничего не отправит.
+    """
+
+    def __init__(
+        self,
+        api: ApiCall,
+        send: SendCall,
+        global_rate: float = BROADCAST_GLOBAL_RATE,
+        chat_rate: float = BROADCAST_CHAT_RATE,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        batch: int = BROADCAST_BATCH,
+        flush_every: int = BROADCAST_FLUSH_EVERY,
+        poll_interval: float = BROADCAST_POLL_INTERVAL,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+        max_flood_waits: int = BROADCAST_MAX_FLOOD_WAITS,
+    ):
+        self.api = api
+        self.send = send
+        # без запаса: после паузы (ожидание следующей пачки) полный bucket на
+        # global_rate токенов дал бы до 2×rate за секунду — выше лимита Telegram
+        self.bucket = TokenBucket(global_rate, capacity=1)
+        self.chats = ChatLimiter(chat_rate)
+        self.concurrency = concurrency
+        self.batch = batch
+        self.flush_every = flush_every
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.max_flood_waits = max_flood_waits
+
+    async def _deliver(self, job: dict, item: dict) -> dict:
+        chat_id = int(item["telegram_id"])
+        text = render_message(job, item)
+        parse_mode = message_parse_mode(job)
+        # max_retries — только на сетевые/прочие ошибки; RetryAfter значит
+        # «подожди и повтори», его считаем отдельно и с большим запасом
+        attempt = flood_waits = 0
+        while True:
+            await self.chats.acquire(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.send(chat_id, text, parse_mode)
+                return {"user_id": item["user_id"], "status": "sent"}
+            except RetryAfter as e:
+                flood_waits += 1
+                if flood_waits > self.max_flood_waits:
+                    return {"user_id": item["user_id"], "status": "failed", "error": "flood wait limit"}
+                log.info("broadcast: RetryAfter %.1fs", e.seconds)
+                self.bucket.pause(e.seconds)
+            except Undeliverable as e:
+                return {"user_id": item["user_id"], "status": "blocked", "error": str(e)}
+            except Rejected as e:
+                return {"user_id": item["user_id"], "status": "failed", "error": str(e)}
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    return {"user_id": item["user_id"], "status": "failed", "error": str(e)}
+                await asyncio.sleep(min(2 ** attempt, 10))
+                attempt += 1
+
+    async def _report(self, job_id: int, cursor: int, results: list, done: bool = False):
+        body = {"cursor": cursor, "results": results, "done": done}
+        status, data = await self.api("POST", f"/admin/broadcast/{job_id}/progress", None, body)
+        if status != 200:
+            raise RuntimeError(f"progress #{job_id}: HTTP {status}: {data.get('detail')}")
+
+    async def _run_batch(self, job: dict, items: list):
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        pending: list = []
+        flush_lock = asyncio.Lock()
+
+        async def flush():
+            async with flush_lock:
+                if pending:
+                    chunk = pending[:]
+                    pending.clear()
+                    # курсор пока старый: пачка не закончена, дедуп идёт по deliveries
+                    await self._report(job["id"], job["cursor"], chunk)
+
+        async def sender():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                pending.append(await self._deliver(job, item))
+                if len(pending) >= self.flush_every:
+                    await flush()
+
+        await asyncio.gather(*(sender() for _ in range(self.concurrency)))
+        await flush()
+
+    async def run_job(self, job: dict):
+        job_id = job["id"]
+        log.info("broadcast #%s (%s) started at cursor %s", job_id, job["kind"], job["cursor"])
+
+        while True:
+            status, data = await self.api("GET", f"/admin/broadcast/{job_id}/batch", {"limit": self.batch}, None)
+            if status != 200:
+                raise RuntimeError(f"batch #{job_id}: HTTP {status}: {data.get('detail')}")
+
+            items = data.get("items") or []
+            if not items:
+                await self._report(job_id, job["cursor"], [], done=True)
+                log.info("broadcast #%s done", job_id)
+                return
+
+            await self._run_batch(data["job"], items)
+            job["cursor"] = data["job"]["cursor"] = items[-1]["user_id"]
+            await self._report(job_id, job["cursor"], [])
+
+    async def run_forever(self):
+        while True:
+            try:
+                status, data = await self.api("GET", "/admin/broadcast/next", None, None)
+                job = data.get("job") if status == 200 else None
+                if job:
+                    await self.run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("broadcast worker error: %s", e)
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,100 @@
+"""
+Холодный старт бота: время импорта bot.py и время до первого обработанного апдейта.
+
+Каждый прогон — новый процесс, как после рестарта контейнера. Внутри процесса
+bot.py импортируется, Bot API подменяется FakeSession (fake_telegram.py),
+и через Dispatcher прогоняется один /start — «первый апдейт» засчитывается,
+когда хендлер отправил ответ (sendMessage). Telegram и backend не нужны.
+
+    cd bot
+    python bench/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..", "app")
+
+
+def child():
+    t0 = time.perf_counter()
+    sys.path[:0] = [APP_DIR, BENCH_DIR]
+    import asyncio
+
+    import bot as bot_module
+
+    t_import = time.perf_counter()
+    from fake_telegram import FakeSession, message_update
+
+    async def first_update():
+        session = bot_module.bot.session = FakeSession()
+        await bot_module.dp.feed_update(bot_module.bot, message_update(bot_module.bot, 1, user_id=42, text="/start"))
+        if not session.calls["sendMessage"]:
+            raise RuntimeError(f"/start did not answer: {dict(session.calls)}")
+
+    asyncio.run(first_update())
+    t_first = time.perf_counter()
+    print(json.dumps({"import_ms": (t_import - t0) * 1000, "first_update_ms": (t_first - t0) * 1000}))
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env["TELEGRAM_BOT_TOKEN"] = "123456:TEST-token"
+    env.pop("ADMIN_TOKEN", None)
+    return env
+
+
+def run_once() -> dict:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        env=child_env(), capture_output=True, text=True, check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # с запуском интерпретатора и выходом процесса
+    result["process_ms"] = (time.perf_counter() - t0) * 1000
+    return result
+
+
+def heaviest_modules(top: int) -> list[tuple[str, float]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        cwd=APP_DIR, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1000))
+    return sorted(modules, key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="сколько самых тяжёлых модулей показать")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child()
+        return
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{'metric':<26}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for key, label in (("import_ms", "import bot.py"), ("first_update_ms", "first update handled"), ("process_ms", "process start -> exit")):
+        values = [r[key] for r in runs]
+        print(f"{label:<26}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+    print("\nheaviest modules (self time):")
+    for name, ms in heaviest_modules(args.top):
+        print(f"  {ms:>8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
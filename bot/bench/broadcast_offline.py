@@ -0,0 +1,137 @@
+"""
+Офлайн-прогон движка рассылки (app/broadcast.py) без Telegram и backend.
+
+FakeBotAPI ведёт себя как Bot API: больше GLOBAL_LIMIT сообщений в секунду
+или больше одного в секунду в один чат — RetryAfter; часть чатов «заблокировала» бота.
+FakeBackend — in-memory версия /admin/broadcast/* с курсором и deliveries.
+
+Сценарий: рассылка на N пользователей, на середине процесс «падает» (задача
+отменяется), новый воркер продолжает с сохранённого места. В конце проверяем,
+что каждый получил сообщение и сколько было дублей.
+
+    cd bot
+    python bench/broadcast_offline.py --users 2000 --rate 25
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from broadcast import BroadcastWorker, RetryAfter, Undeliverable  # noqa: E402
+
+GLOBAL_LIMIT = 30
+
+
+class FakeBotAPI:
+    def __init__(self, blocked: set, latency: float = 0.03):
+        self.blocked = blocked
+        self.latency = latency
+        self.delivered: Counter = Counter()
+        self.retry_after = 0
+        self._recent: deque = deque()
+        self._last_per_chat: dict = {}
+
+    async def send(self, chat_id: int, text: str, parse_mode=None):
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= GLOBAL_LIMIT or now - self._last_per_chat.get(chat_id, -10) < 1.0:
+            self.retry_after += 1
+            raise RetryAfter(1)
+        if chat_id in self.blocked:
+            raise Undeliverable("Forbidden: bot was blocked by the user")
+        self._recent.append(now)
+        self._last_per_chat[chat_id] = now
+        self.delivered[chat_id] += 1
+
+
+class FakeBackend:
+    def __init__(self, users: int):
+        self.users = [(i, 5_000_000 + i) for i in range(1, users + 1)]
+        self.job = {"id": 1, "kind": "text", "text": "hello", "status": "pending", "cursor": 0, "sent": 0, "failed": 0}
+        self.deliveries: dict = {}
+
+    async def api(self, method, path, params=None, json=None):
+        job = self.job
+        if path == "/admin/broadcast/next":
+            if job["status"] in ("pending", "running"):
+                job["status"] = "running"
+                return 200, {"job": dict(job)}
+            return 200, {"job": None}
+        if path.endswith("/batch"):
+            limit = params["limit"]
+            items = [
+                {"user_id": uid, "telegram_id": str(tid)}
+                for uid, tid in self.users
+                if uid > job["cursor"] and uid not in self.deliveries
+            ][:limit]
+            return 200, {"job": dict(job), "items": items}
+        if path.endswith("/progress"):
+            for r in json["results"]:
+                if r["user_id"] not in self.deliveries:
+                    self.deliveries[r["user_id"]] = r["status"]
+                    job["sent" if r["status"] == "sent" else "failed"] += 1
+            job["cursor"] = max(job["cursor"], json["cursor"])
+            if json["done"]:
+                job["status"] = "done"
+            return 200, {"ok": True}
+        return 404, {"detail": "not found"}
+
+
+async def run(args):
+    backend = FakeBackend(args.users)
+    blocked = {5_000_000 + i for i in random.sample(range(1, args.users + 1), args.users // 50)}
+    tg = FakeBotAPI(blocked)
+
+    def worker():
+        return BroadcastWorker(backend.api, tg.send, global_rate=args.rate, poll_interval=0.01)
+
+    started = time.perf_counter()
+
+    # первый воркер «падает» на середине рассылки
+    task = asyncio.create_task(worker().run_forever())
+    while sum(tg.delivered.values()) < args.users // 2:
+        await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    crashed_at = backend.job["cursor"]
+
+    # второй продолжает с сохранённого курсора/deliveries
+    task = asyncio.create_task(worker().run_forever())
+    while backend.job["status"] != "done":
+        await asyncio.sleep(0.05)
+    task.cancel()
+
+    elapsed = time.perf_counter() - started
+    reachable = args.users - len(blocked)
+    missing = reachable - len(tg.delivered)
+    dupes = sum(c - 1 for c in tg.delivered.values() if c > 1)
+
+    print(f"users:            {args.users} ({len(blocked)} blocked)")
+    print(f"resumed at:       users.id > {crashed_at}")
+    print(f"delivered:        {len(tg.delivered)} chats, missing {missing}, duplicates {dupes}")
+    print(f"backend counters: sent={backend.job['sent']} failed={backend.job['failed']}")
+    print(f"RetryAfter hits:  {tg.retry_after}")
+    print(f"elapsed:          {elapsed:.1f}s  ({sum(tg.delivered.values()) / elapsed:.1f} msg/s)")
+    return 0 if missing == 0 else 1
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--rate", type=float, default=25)
+    args = ap.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
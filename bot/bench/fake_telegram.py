@@ -0,0 +1,108 @@
+"""
+Bot API без сети для офлайн-бенчмарков бота.
+
+FakeSession подменяет AiohttpSession: запросы не уходят в Telegram,
+а записываются в `calls`; ответ собирается по имени метода и проходит
+через тот же check_response/pydantic, что и настоящий ответ API.
+
+    from fake_telegram import FakeSession, message_update, callback_update
+    bot.session = FakeSession()
+    await dp.feed_update(bot, message_update(bot, 1, user_id=42, text="/start"))
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+TEST_TOKEN = "123456:TEST-token"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "AronxVPN", "username": "aronxvpn_test_bot"}
+
+# методы, которые отвечают Message; остальные (answerCallbackQuery и т.п.) — True
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "editMessageText", "editMessageReplyMarkup"}
+
+
+def _chat(chat_id: int) -> dict:
+    return {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"}
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.last_call_at: Optional[float] = None
+        self._message_id = 0
+
+    def _result(self, method: TelegramMethod) -> Any:
+        name = method.__api_method__
+        if name == "getMe":
+            return BOT_USER
+        if name in MESSAGE_METHODS:
+            self._message_id += 1
+            chat_id = int(getattr(method, "chat_id", None) or 1)
+            message = {"message_id": self._message_id, "date": int(time.time()), "chat": _chat(chat_id)}
+            if getattr(method, "text", None):
+                message["text"] = method.text
+            return message
+        return True
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[method.__api_method__] += 1
+        self.last_call_at = time.perf_counter()
+        content = json.dumps({"ok": True, "result": self._result(method)})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def message_update(bot: Bot, update_id: int, user_id: int, text: str) -> Update:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": _chat(user_id),
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.model_validate({"update_id": update_id, "message": message}, context={"bot": bot})
+
+
+def callback_update(bot: Bot, update_id: int, user_id: int, data: str, message_text: str = "menu") -> Update:
+    callback = {
+        "id": str(update_id),
+        "from": _user(user_id),
+        "chat_instance": str(user_id),
+        "data": data,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": _chat(user_id),
+            "from": BOT_USER,
+            "text": message_text,
+        },
+    }
+    return Update.model_validate({"update_id": update_id, "callback_query": callback}, context={"bot": bot})
@@ -0,0 +1,216 @@
+"""
+Офлайн-прогон хендлеров bot.py: тысячи синтетических апдейтов через Dispatcher.
+
+Bot API подменён FakeSession (fake_telegram.py), backend — FakeBackend
+(подменяет bot.api_json), так что не нужны ни Telegram-аккаунт, ни сеть.
+Сценарии повторяют реальные нажатия: /start, «Мой VPN», QR, статус,
+ввод инвайта после «Подключиться по инвайту», сброс и т.д.
+
+Отчёт: апдейтов в секунду, латентность по каждому хендлеру
+(inner-middleware на router) и лаг event loop'а (задача-сэмплер) —
+новый тяжёлый хендлер виден до деплоя.
+
+    cd bot
+    python bench/replay.py --updates 5000 --concurrency 50
+    python bench/replay.py --updates 2000 --backend-latency 20 --scenario m:qr
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, "..", "app"), BENCH_DIR]
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:TEST-token")
+# спаны в stdout смешались бы с отчётом; включить — TRACE_SAMPLE_RATE=1
+os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+
+from aiogram.dispatcher.event.bases import UNHANDLED  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from fake_telegram import FakeSession, callback_update, message_update  # noqa: E402
+
+LINK = "vless://11111111-2222-3333-4444-555555555555@203.0.113.10:443?type=tcp&security=reality#AronxVPN"
+
+# сценарий -> вес в случайной смеси; "invite" — два апдейта (кнопка + ввод кода)
+SCENARIOS = {
+    "/start": 20,
+    "/help": 5,
+    "m:menu": 10,
+    "m:guide": 5,
+    "m:me": 25,
+    "m:qr": 10,
+    "m:status": 10,
+    "m:reset:yes": 5,
+    "invite": 10,
+}
+
+
+class FakeBackend:
+    """Ответы backend для ручек, которые дёргает бот; latency — задержка «сети»."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+
+    def _access(self, existing: bool = False) -> dict:
+        return {"vless_link": LINK, "subscription_url": "https://vpn.example.com/sub/token", "existing": existing}
+
+    async def api_json(self, method, url, *, params=None, headers=None, json=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = url[len(bot_module.API_BASE):]
+        self.calls[f"{method} {path}"] += 1
+
+        if url == bot_module.API_ME:
+            return 200, self._access()
+        if url == bot_module.API_USE_INVITE:
+            return 200, self._access(existing=False)
+        if url == bot_module.API_RESET:
+            return 200, {**self._access(), "old_uuid": "old", "new_uuid": "new"}
+        if url == bot_module.API_HEALTH:
+            comp = {"ok": True, "latency_ms": 1.5, "detail": None}
+            return 200, {
+                "status": "ok",
+                "age_seconds": 3.0,
+                "components": {"database": comp, "xui_login": comp, "xui_inbound": comp},
+            }
+        return 404, {"detail": "Not Found", "_debug_url": url}
+
+
+def build_items(bot, updates: int, users: int, only: str | None, seed: int) -> list:
+    """Список «действий пользователя»; каждое — апдейты, которые идут строго по порядку."""
+    rnd = random.Random(seed)
+    names = [only] if only else list(SCENARIOS)
+    weights = [SCENARIOS[n] for n in names]
+    items = []
+    update_id = 0
+    total = 0
+    while total < updates:
+        name = rnd.choices(names, weights)[0]
+        user_id = 1_000_000 + rnd.randrange(users)
+        batch = []
+        if name.startswith("/"):
+            update_id += 1
+            batch.append(message_update(bot, update_id, user_id, name))
+        elif name == "invite":
+            update_id += 1
+            batch.append(callback_update(bot, update_id, user_id, "m:register"))
+            update_id += 1
+            batch.append(message_update(bot, update_id, user_id, f"INV{user_id}"))
+        else:
+            update_id += 1
+            text = f"📎 Ссылка:\n`{LINK}`" if name == "m:qr" else "menu"
+            batch.append(callback_update(bot, update_id, user_id, name, message_text=text))
+        items.append(batch)
+        total += len(batch)
+    return items
+
+
+class HandlerTimer:
+    """Inner-middleware: время каждого вызова хендлера по имени функции."""
+
+    def __init__(self):
+        self.samples: dict = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[name].append(time.perf_counter() - t0)
+
+
+async def loop_lag_sampler(samples: list, interval: float, stop: asyncio.Event):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - t0 - interval))
+
+
+def pct(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def ms_row(label: str, values: list, width: int = 22) -> str:
+    return (
+        f"{label:<{width}}{len(values):>8}"
+        f"{statistics.median(values) * 1000:>10.2f}{pct(values, 0.95) * 1000:>10.2f}"
+        f"{pct(values, 0.99) * 1000:>10.2f}{max(values) * 1000:>10.2f}"
+    )
+
+
+async def run(args):
+    bot, dp = bot_module.bot, bot_module.dp
+    session = bot.session = FakeSession(latency=args.telegram_latency / 1000)
+    backend = FakeBackend(latency=args.backend_latency / 1000)
+    bot_module.api_json = backend.api_json
+
+    timer = HandlerTimer()
+    bot_module.router.message.middleware(timer)
+    bot_module.router.callback_query.middleware(timer)
+
+    items = build_items(bot, args.updates, args.users, args.scenario, args.seed)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    unhandled = 0
+
+    async def worker():
+        nonlocal unhandled
+        while True:
+            try:
+                batch = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for update in batch:
+                result = await dp.feed_update(bot, update)
+                if result is UNHANDLED:
+                    unhandled += 1
+
+    lag: list = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(loop_lag_sampler(lag, args.lag_interval / 1000, stop))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await sampler
+
+    fed = sum(len(b) for b in items)
+    print(f"updates: {fed}  concurrency: {args.concurrency}  elapsed: {elapsed:.2f}s  "
+          f"throughput: {fed / elapsed:.0f} updates/s  unhandled: {unhandled}")
+    print(f"\n{'handler':<22}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, values in sorted(timer.samples.items(), key=lambda kv: -statistics.median(kv[1])):
+        print(ms_row(name, values))
+    if lag:
+        print("\n" + ms_row("event loop lag", lag))
+    print("\nBot API calls: " + ", ".join(f"{k}={v}" for k, v in session.calls.most_common()))
+    print("backend calls: " + ", ".join(f"{k}={v}" for k, v in backend.calls.most_common()))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=50, help="сколько апдейтов обрабатывается одновременно")
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--scenario", choices=list(SCENARIOS), help="гонять только один сценарий")
+    ap.add_argument("--backend-latency", type=float, default=0.0, help="мс на вызов backend")
+    ap.add_argument("--telegram-latency", type=float, default=0.0, help="мс на вызов Bot API")
+    ap.add_argument("--lag-interval", type=float, default=10.0, help="период сэмплера лага, мс")
+    ap.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import contextlib
+import contextvars
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+# Общий модуль bot и backend: backend/app/tracing.py и bot/app/tracing.py — симлинки
+# сюда, в образы файл кладёт COPY common/tracing.py (контекст сборки — корень репо).
+# Различие между сервисами только в env SERVICE_NAME.
+SERVICE_NAME = os.getenv("SERVICE_NAME", "aronxvpn")
+# доля трассируемых запросов/апдейтов (0..1); решение вызывающего уходит в X-Trace-Sampled
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+# общий секрет bot <-> backend: входящим trace-заголовкам верим только с ним,
+# иначе любой снаружи мог бы включить полное логирование спанов на каждый запрос
+TRACE_TOKEN = os.getenv("TRACE_TOKEN", "").strip()
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").strip()
+
+TRACE_HEADER = "X-Trace-Id"
+SAMPLED_HEADER = "X-Trace-Sampled"
+PARENT_HEADER = "X-Parent-Span-Id"
+TOKEN_HEADER = "X-Trace-Token"
+
+_trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("trace_sampled", default=False)
+_span_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("span_id", default=None)
+
+log = logging.getLogger("trace")
+if not log.handlers:
+    _h = logging.StreamHandler(sys.stdout)
+    _h.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_h)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def should_sample() -> bool:
+    return random.random() < TRACE_SAMPLE_RATE
+
+
+def current_trace_id() -> str | None:
+    return _trace_id.get()
+
+
+def propagation_headers() -> dict:
+    """Заголовки для исходящего запроса в другой сервис."""
+    trace_id = _trace_id.get()
+    if trace_id is None:
+        return {}
+    headers = {TRACE_HEADER: trace_id, SAMPLED_HEADER: "1" if _sampled.get() else "0"}
+    if _span_id.get():
+        headers[PARENT_HEADER] = _span_id.get()
+    if TRACE_TOKEN:
+        headers[TOKEN_HEADER] = TRACE_TOKEN
+    return headers
+
+
+def is_trusted(token: str | None) -> bool:
+    """Пришли ли входящие trace-заголовки от своего сервиса (см. TRACE_TOKEN)."""
+    return bool(TRACE_TOKEN) and token is not None and hmac.compare_digest(token, TRACE_TOKEN)
+
+
+def start_trace(trace_id: str | None, sampled: bool | None, parent_span_id: str | None = None):
+    """Привязать трейс к текущему контексту (HTTP middleware / начало обработки апдейта)."""
+    _trace_id.set(trace_id or new_trace_id())
+    _sampled.set(should_sample() if sampled is None else sampled)
+    _span_id.set(parent_span_id)
+
+
+def parse_sampled(value: str | None) -> bool | None:
+    if value is None:
+        return None
+    return value.strip() in ("1", "true", "yes")
+
+
+def _emit_span(name: str, span_id: str, parent_id: str | None, start: float, duration: float, status: str, attrs: dict):
+    out = {
+        "ts": round(start, 6),
+        "service": SERVICE_NAME,
+        "trace_id": _trace_id.get(),
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "span": name,
+        "duration_ms": round(duration * 1000, 2),
+        "status": status,
+    }
+    if attrs:
+        out["attrs"] = attrs
+    _emit(out)
+
+
+def record(name: str, start: float, duration: float, status: str = "ok", **attrs):
+    """Записать уже измеренный спан (start — time.time(), duration — секунды)."""
+    if not _sampled.get() or _trace_id.get() is None:
+        return
+    _emit_span(name, uuid.uuid4().hex[:16], _span_id.get(), start, duration, status, attrs)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    Спан вокруг блока кода. В блок отдаётся dict — туда можно дописать
+    атрибуты (например, HTTP-статус). Вложенные спаны получают parent_id.
+    """
+    if not _sampled.get() or _trace_id.get() is None:
+        yield attrs
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    parent = _span_id.get()
+    token = _span_id.set(span_id)
+    start = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "error"
+        attrs["error"] = f"{e.__class__.__name__}: {str(e)[:200]}"
+        raise
+    finally:
+        _span_id.reset(token)
+        _emit_span(name, span_id, parent, start, time.perf_counter() - t0, status, attrs)
+
+
+def _emit(span_dict: dict):
+    log.info(json.dumps(span_dict, ensure_ascii=False, default=str))
+    if _otlp is not None:
+        try:
+            _otlp(span_dict)
+        except Exception:
+            pass
+
+
+def _init_otlp():
+    """
+    Опциональный экспорт в OTLP (Jaeger/Tempo/...): нужен OTEL_EXPORTER_OTLP_ENDPOINT
+    и пакеты opentelemetry-sdk + opentelemetry-exporter-otlp-proto-http.
+    Без них — только JSON-логи.
+    """
+    if not OTLP_ENDPOINT:
+        return None
+    try:
+        from opentelemetry import trace as ot
+        from opentelemetry.context import Context
+        from opentelemetry.sdk.trace.id_generator import IdGenerator
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        log.warning(json.dumps({"service": SERVICE_NAME, "warning": "OTLP endpoint set but opentelemetry is not installed"}))
+        return None
+
+    ids = threading.local()
+
+    class _OurIds(IdGenerator):
+        # OTel-спан получает те же trace_id/span_id, что и JSON-лог,
+        # иначе parent_id дочерних спанов указывали бы в никуда
+        def generate_span_id(self) -> int:
+            return ids.span_id
+
+        def generate_trace_id(self) -> int:
+            return ids.trace_id
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        id_generator=_OurIds(),
+    )
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    tracer = provider.get_tracer("aronxvpn")
+
+    def export(s: dict):
+        ids.trace_id = int(s["trace_id"], 16)
+        ids.span_id = int(s["span_id"], 16)
+        ctx = Context()
+        if s.get("parent_id"):
+            ctx = ot.set_span_in_context(ot.NonRecordingSpan(ot.SpanContext(
+                trace_id=ids.trace_id,
+                span_id=int(s["parent_id"], 16),
+                is_remote=True,
+                trace_flags=ot.TraceFlags(ot.TraceFlags.SAMPLED),
+            )))
+        start_ns = int(s["ts"] * 1e9)
+        otel_span = tracer.start_span(
+            s["span"],
+            context=ctx,
+            start_time=start_ns,
+            attributes={k: str(v) for k, v in (s.get("attrs") or {}).items()},
+        )
+        if s["status"] == "error":
+            otel_span.set_status(ot.Status(ot.StatusCode.ERROR))
+        otel_span.end(end_time=start_ns + int(s["duration_ms"] * 1e6))
+
+    return export
+
+
+_otlp = _init_otlp()
+
+if TRACE_SAMPLE_RATE > 0 and not TRACE_TOKEN:
+    # без общего TRACE_TOKEN backend не верит заголовкам бота и семплирует сам —
+    # трейс апдейта и трейс запроса в backend не склеиваются
+    log.warning(json.dumps({"service": SERVICE_NAME, "warning": "TRACE_TOKEN is not set, bot -> backend traces are not linked"}))